@@ -0,0 +1,100 @@
+# -*- coding:utf-8 -*-
+"""
+对比 /api/grab/run 的两种执行方式：
+1. 旧方式：每个账号启动一次 python meituan.py 子进程
+2. 新方式：进程内线程池直接调用领取逻辑
+
+领取接口由本地桩服务代替，不会请求美团。
+
+用法: python benchmarks/bench_grab_run.py [--sizes 10,100,1000] [--workers 8] [--latency 0.05]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+STUB_RESPONSE = json.dumps({
+    'data': {'allCoupons': [{'couponName': '测试券', 'couponAmount': 5, 'amountLimit': '满20可用', 'etime': '2099-12-31'}]}
+}, ensure_ascii=False).encode()
+
+
+def start_stub_server(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(STUB_RESPONSE)))
+            self.end_headers()
+            self.wfile.write(STUB_RESPONSE)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_subprocess(tokens):
+    script_path = os.path.join(ROOT_DIR, 'meituan.py')
+    for token in tokens:
+        env = os.environ.copy()
+        env['MEITUAN_TOKEN'] = token
+        subprocess.run([sys.executable, script_path], capture_output=True, text=True, timeout=120, env=env)
+
+
+def run_in_process(tokens, workers):
+    from meituan import create_session, grab_account, summarize_results
+
+    session = create_session(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(grab_account, token, session) for token in tokens]
+        for future in futures:
+            summarize_results(future.result(timeout=120))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比子进程与进程内执行领取的耗时')
+    parser.add_argument('--sizes', default='10,100,1000', help='账号数量，逗号分隔')
+    parser.add_argument('--workers', type=int, default=8, help='进程内执行的线程数')
+    parser.add_argument('--latency', type=float, default=0.05, help='桩服务模拟的接口延迟（秒）')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency)
+    # 导入 meituan 之前设置，子进程也会继承
+    os.environ['MEITUAN_GRAB_URL'] = f'http://127.0.0.1:{server.server_port}/gundam/gundamGrabV4'
+    # 比较的是执行方式本身的开销，关闭请求限流
+    os.environ['GRAB_RATE_LIMIT'] = '0'
+
+    print(f"{'账号数':>8} {'子进程(s)':>12} {'进程内(s)':>12} {'加速比':>8}")
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        tokens = [f'bench-token-{i}' for i in range(size)]
+
+        start = time.perf_counter()
+        run_subprocess(tokens)
+        subprocess_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run_in_process(tokens, args.workers)
+        in_process_elapsed = time.perf_counter() - start
+
+        print(f"{size:>8} {subprocess_elapsed:>12.2f} {in_process_elapsed:>12.2f} {subprocess_elapsed / in_process_elapsed:>7.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding:utf-8 -*-
+"""
+对比登录页和控制台页面的两种返回方式：
+1. 旧方式：每次请求调用 render_template_string，重新解析编译整段模板
+2. 新方式：启动时编译渲染一次并预压缩，脚本拆为带内容哈希的静态资源
+
+使用临时数据目录，不会修改已有数据库。
+
+用法: python benchmarks/bench_page_render.py [--requests 500]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='bench-page-'))
+os.environ.setdefault('RETENTION_INTERVAL_HOURS', '0')
+
+from flask import render_template_string
+
+import web
+
+HEADERS = {'Accept-Encoding': 'gzip, br'}
+
+
+def measure(func, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        func()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def render_legacy(template):
+    def run():
+        with web.app.test_request_context(headers=HEADERS):
+            return render_template_string(template).encode('utf-8')
+    return run
+
+
+def serve_cached(page, etag=None):
+    def run():
+        headers = dict(HEADERS, **({'If-None-Match': f'"{etag}"'} if etag else {}))
+        with web.app.test_request_context(headers=headers):
+            return page.response(web.app.response_class).get_data()
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比页面渲染耗时与传输大小')
+    parser.add_argument('--requests', type=int, default=500, help='每种方式的请求次数')
+    args = parser.parse_args()
+
+    scripts = {name.split('-')[0]: asset for name, asset in web.ASSETS.items()}
+    pages = [
+        ('login', web.LOGIN_TEMPLATE, web.LOGIN_PAGE),
+        ('dashboard', web.DASHBOARD_TEMPLATE, web.DASHBOARD_PAGE),
+    ]
+
+    print(f"{'页面':<10} {'方式':<14} {'耗时/次':>10} {'传输大小':>10}")
+    for name, template, page in pages:
+        legacy = render_legacy(template)
+        cached = serve_cached(page)
+        revalidate = serve_cached(page, page.etag)
+        script = scripts.get(name)
+        first_visit = len(cached()) + (len(serve_cached(script)()) if script else 0)
+        rows = [
+            ('旧方式', measure(legacy, args.requests), len(legacy())),
+            ('预编译+压缩', measure(cached, args.requests), first_visit),
+            ('304 再验证', measure(revalidate, args.requests), len(revalidate())),
+        ]
+        for label, us, size in rows:
+            print(f"{name:<10} {label:<14} {us:>8.1f} us {size:>8} B")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# -*- coding:utf-8 -*-
+"""
+对比领取请求的两种构造方式：
+1. 旧方式：每次调用重建 payload 字典并由 requests 序列化 json=
+2. 新方式：复用 Campaign 预编码的请求体 bytes 和请求头模板
+
+只构造 PreparedRequest，不发送网络请求。
+
+用法: python benchmarks/bench_payload_encoding.py [--calls 2000]
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from meituan import BASE_HEADERS, GRAB_URL, get_campaigns
+
+
+def prepare_legacy(campaign, token):
+    # 旧代码在函数体内重新构造 payload 和 headers
+    data = copy.deepcopy(campaign.payload)
+    headers = dict(BASE_HEADERS)
+    headers['Cookie'] = f"token={token};"
+    return requests.Request('POST', GRAB_URL, json=data, headers=headers).prepare()
+
+
+def prepare_cached(campaign, token):
+    return requests.Request('POST', GRAB_URL, data=campaign.body, headers=campaign.build_headers(token)).prepare()
+
+
+def measure(func, campaigns, calls):
+    tracemalloc.start()
+    allocated = 0
+    start = time.perf_counter()
+    for i in range(calls):
+        campaign = campaigns[i % len(campaigns)]
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func(campaign, f'bench-token-{i}')
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return allocated / calls, elapsed / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比预编码请求体的分配与耗时')
+    parser.add_argument('--calls', type=int, default=2000, help='每种方式的调用次数')
+    args = parser.parse_args()
+
+    campaigns = get_campaigns()
+    print(f"活动数: {len(campaigns)}，请求体大小: {', '.join(f'{c.key}={len(c.body)}B' for c in campaigns)}")
+    print(f"{'方式':<8} {'峰值分配/次':>14} {'耗时/次':>12}")
+    legacy_bytes, legacy_us = measure(prepare_legacy, campaigns, args.calls)
+    cached_bytes, cached_us = measure(prepare_cached, campaigns, args.calls)
+    print(f"{'旧方式':<8} {legacy_bytes:>12.0f} B {legacy_us:>10.1f} us")
+    print(f"{'预编码':<8} {cached_bytes:>12.0f} B {cached_us:>10.1f} us")
+    print(f"每次调用节省 {legacy_bytes - cached_bytes:.0f} B ({1 - cached_bytes / legacy_bytes:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# -*- coding:utf-8 -*-
+"""
+HTTP 响应压缩
+按 Accept-Encoding 协商 br / gzip，小于阈值的响应不压缩；
+流式响应（SSE）逐块压缩并 Z_SYNC_FLUSH，客户端可以立即解出每一块；
+页面和脚本等固定内容用 StaticAsset 在启动时压缩一次
+"""
+import os
+import gzip
+import zlib
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用 gzip
+    brotli = None
+
+from flask import request
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+COMPRESSIBLE_TYPES = ('text/html', 'text/plain', 'text/css', 'text/event-stream', 'application/json', 'application/javascript')
+
+
+def supported_encodings():
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def choose_encoding():
+    """从请求的 Accept-Encoding 中选择服务端支持的编码，没有可用编码时返回 None"""
+    return request.accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    return gzip.compress(data, COMPRESS_LEVEL if level is None else level, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """逐块压缩，每块之后刷新输出，适用于 SSE 等长连接"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def encoded_etag(etag, encoding):
+    """同一内容的各个编码使用不同的强 ETag，如 <tag>-gzip"""
+    return f'{etag}-{encoding}' if encoding else etag
+
+
+def matching_etag(etag):
+    """返回 If-None-Match 中与该内容任一编码匹配的 ETag，没有时返回 None"""
+    for encoding in (None, *supported_encodings()):
+        tag = encoded_etag(etag, encoding)
+        if request.if_none_match.contains(tag):
+            return tag
+    return None
+
+
+def set_encoding(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(encoded_etag(etag, encoding))
+
+
+def compress_response(response):
+    """after_request 钩子：按协商结果压缩响应"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    if response.is_streamed:
+        encoding = choose_encoding()
+        add_vary(response)
+        if encoding:
+            response.response = compress_stream(response.iter_encoded(), encoding)
+            set_encoding(response, encoding)
+            response.headers.pop('Content-Length', None)
+        return response
+
+    if response.direct_passthrough:
+        return response
+    data = response.get_data()
+    add_vary(response)
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = choose_encoding()
+    if encoding:
+        response.set_data(compress(data, encoding))
+        set_encoding(response, encoding)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
+
+
+class StaticAsset:
+    """启动时生成并压缩一次的固定内容，带内容哈希 ETag，请求时直接返回对应编码的内容"""
+
+    def __init__(self, content, mimetype='text/html', immutable=False):
+        self.body = content.encode('utf-8')
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        # 文件名带内容哈希的资源可以长期缓存，页面本身每次向服务端确认
+        self.cache_control = 'public, max-age=31536000, immutable' if immutable else 'private, no-cache'
+        # 只压缩一次，使用最高压缩级别
+        self.variants = {encoding: compress(self.body, encoding, 11 if encoding == 'br' else 9) for encoding in supported_encodings()}
+
+    def response(self, response_class):
+        etag = matching_etag(self.etag)
+        if etag:
+            response = response_class(status=304)
+        else:
+            encoding = choose_encoding()
+            response = response_class(self.variants.get(encoding, self.body), mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            etag = encoded_etag(self.etag, encoding)
+        response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = self.cache_control
+        return response
@@ -8,34 +8,46 @@ cron: 0 8,14 * * *
 import os
 import sys
 import json
+import time
+import sqlite3
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # 添加当前目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from meituan import grab_waimai_coupons, grab_tuangou_coupons
+from meituan import (
+    grab_campaign, grab_account, get_campaigns, summarize_results,
+    create_session, format_pool_stats, POOL_SIZE
+)
+from storage import connect, compress_text, get_db_path, UPSERT_DAILY_STATS_SQL
+from migrations import upgrade
+from rotating_log import redirect_output
+from ratelimit import start_delays
 
+# 并发请求数，可通过 --concurrency 参数或环境变量调整
+DEFAULT_CONCURRENCY = int(os.environ.get('GRAB_CONCURRENCY', '8'))
+# 领取历史每批写入的条数，可通过 --batch-size 参数或环境变量调整
+DEFAULT_BATCH_SIZE = int(os.environ.get('HISTORY_BATCH_SIZE', '50'))
+# 数据库暂时被锁定时每批的重试次数，重试间隔从 FLUSH_RETRY_DELAY 秒开始翻倍
+FLUSH_RETRIES = 3
+FLUSH_RETRY_DELAY = 0.5
 
-def get_db_path():
-    """获取数据库路径"""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    default_data_dir = '/app/data' if os.path.exists('/app') else os.path.join(script_dir, 'data')
-    data_dir = os.environ.get('DATA_DIR', default_data_dir)
-    return os.environ.get('DB_PATH', f'{data_dir}/meituan.db')
 
-
-def get_active_accounts():
-    """从数据库获取所有启用的账号"""
-    import sqlite3
-    
+def get_active_accounts(conn=None, log=print):
+    """从数据库获取所有启用的账号，conn 为常驻进程复用的连接"""
     db_path = get_db_path()
     
-    if not os.path.exists(db_path):
-        print(f"[错误] 数据库文件不存在: {db_path}")
+    if conn is None and not os.path.exists(db_path):
+        log(f"[错误] 数据库文件不存在: {db_path}")
         return []
     
     try:
-        conn = sqlite3.connect(db_path)
+        owns_conn = conn is None
+        if owns_conn:
+            conn = connect(db_path, readonly=True)
         cursor = conn.cursor()
         
         # 查询所有启用的账号
@@ -53,167 +65,252 @@ def get_active_accounts():
                 'token': row[2]
             })
         
-        conn.close()
+        cursor.close()
+        if owns_conn:
+            conn.close()
         return accounts
         
     except Exception as e:
-        print(f"[错误] 读取数据库失败: {e}")
+        log(f"[错误] 读取数据库失败: {e}")
         return []
 
 
-def save_grab_history(account_id, status, success_count, failed_count, details, raw_output):
-    """保存领取历史到数据库"""
-    import sqlite3
+class HistoryWriter:
+    """在同一个数据库连接上缓冲领取历史、账号状态和按日统计，按批次写入"""
     
-    db_path = get_db_path()
+    INSERT_HISTORY_SQL = """
+        INSERT INTO grab_histories 
+        (account_id, grab_time, status, total_coupons, success_count, failed_count, limiter_wait_ms, details)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    INSERT_RAW_OUTPUT_SQL = "INSERT INTO grab_raw_outputs (history_id, data) VALUES (?, ?)"
+    UPDATE_ACCOUNT_SQL = """
+        UPDATE meituan_accounts 
+        SET last_run_at = ?, last_run_status = ?
+        WHERE id = ?
+    """
     
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # 插入领取历史
-        cursor.execute("""
-            INSERT INTO grab_histories 
-            (account_id, grab_time, status, total_coupons, success_count, failed_count, details, raw_output)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+    def __init__(self, db_path=None, batch_size=DEFAULT_BATCH_SIZE, conn=None, log=print):
+        # 传入的连接由调用方负责关闭
+        self.owns_conn = conn is None
+        self.conn = conn if conn is not None else connect(db_path)
+        self.batch_size = max(1, batch_size)
+        # 写入失败时保留缓冲，再积累一批后重试
+        self.next_flush = self.batch_size
+        self.log = log
+        self.histories = []
+        self.raw_outputs = []
+        self.account_updates = []
+        self.daily_stats = []
+        self.limiter_wait_ms = 0
+    
+    def add(self, account_id, status, success_count, failed_count, details, raw_output, limiter_wait_ms=0):
+        """缓冲一条领取历史，达到批次大小时写入"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.histories.append((
             account_id,
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            now,
             status,
             success_count + failed_count,
             success_count,
             failed_count,
-            json.dumps(details, ensure_ascii=False),
-            raw_output
+            limiter_wait_ms,
+            json.dumps(details, ensure_ascii=False)
         ))
-        
-        # 更新账号最后执行时间和状态
-        cursor.execute("""
-            UPDATE meituan_accounts 
-            SET last_run_at = ?, last_run_status = ?
-            WHERE id = ?
-        """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), status, account_id))
-        
-        conn.commit()
-        conn.close()
-        
-    except Exception as e:
-        print(f"[错误] 保存历史记录失败: {e}")
-
-
-def parse_output(output):
-    """解析领取输出"""
-    result = {'success': 0, 'failed': 0, 'coupons': []}
-    
-    for line in output.split('\n'):
-        line = line.strip()
-        if not line:
-            continue
-        if '成功领取' in line:
-            result['success'] += 1
-            result['coupons'].append({'name': line, 'status': 'success'})
-        elif '领取失败' in line or '请求异常' in line:
-            result['failed'] += 1
-            result['coupons'].append({'name': line, 'status': 'failed'})
+        self.limiter_wait_ms += limiter_wait_ms
+        self.raw_outputs.append(compress_text(raw_output))
+        self.account_updates.append((now, status, account_id))
+        self.daily_stats.append({
+            'account_id': account_id,
+            'day': now[:10],
+            'success_count': success_count,
+            'failed_count': failed_count,
+            'total_coupons': success_count + failed_count
+        })
+        if len(self.histories) >= self.next_flush:
+            self.flush()
     
-    return result
-
-
-def run_grab_for_account(account):
-    """为单个账号执行领取"""
-    import io
-    import contextlib
+    def flush(self):
+        """写入缓冲的记录并提交，数据库被锁定时退避重试；失败时保留缓冲并返回 False"""
+        if not self.histories:
+            return True
+        for attempt in range(FLUSH_RETRIES + 1):
+            try:
+                self.write_batch()
+                break
+            except sqlite3.OperationalError as e:
+                if attempt < FLUSH_RETRIES:
+                    delay = FLUSH_RETRY_DELAY * 2 ** attempt
+                    self.log(f"[警告] 保存历史记录失败，{delay:.1f} 秒后重试: {e}")
+                    time.sleep(delay)
+                    continue
+                error = e
+            except Exception as e:
+                error = e
+            self.log(f"[错误] 保存历史记录失败，{len(self.histories)} 条记录稍后重试: {error}")
+            self.next_flush = len(self.histories) + self.batch_size
+            return False
+        self.histories = []
+        self.raw_outputs = []
+        self.account_updates = []
+        self.daily_stats = []
+        self.next_flush = self.batch_size
+        return True
     
-    account_id = account['id']
-    name = account['name']
-    token = account['token']
+    def write_batch(self):
+        # 失败时整个事务回滚，可以原样重试
+        with self.conn:
+            self.conn.executemany(self.INSERT_HISTORY_SQL, self.histories)
+            # 同一事务内其他连接无法写入，本批记录的 id 是连续的
+            last_id = self.conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            first_id = last_id - len(self.histories) + 1
+            self.conn.executemany(self.INSERT_RAW_OUTPUT_SQL, [
+                (first_id + i, data) for i, data in enumerate(self.raw_outputs)
+            ])
+            self.conn.executemany(self.UPDATE_ACCOUNT_SQL, self.account_updates)
+            self.conn.executemany(UPSERT_DAILY_STATS_SQL, self.daily_stats)
     
-    print(f"\n账号: {name}")
-    print("-" * 50)
+    def close(self):
+        if not self.flush():
+            self.log(f"[错误] {len(self.histories)} 条领取历史未能保存")
+        if self.owns_conn:
+            self.conn.close()
     
-    # 捕获输出
-    output_buffer = io.StringIO()
+    def __enter__(self):
+        return self
     
-    waimai_success = False
-    tuangou_success = False
+    def __exit__(self, *exc):
+        self.close()
+
+
+def finish_account(account, results, writer, log=print):
+    """汇总单个账号各活动的领取结果，打印输出并保存历史"""
+    summary = summarize_results(results)
     
-    # 领取外卖红包
-    with contextlib.redirect_stdout(output_buffer):
-        try:
-            waimai_success = grab_waimai_coupons(token)
-        except Exception as e:
-            print(f"[外卖] 执行异常: {e}")
+    # 同时打印到控制台
+    log(summary['raw_output'])
     
-    # 领取团购红包
-    with contextlib.redirect_stdout(output_buffer):
-        try:
-            tuangou_success = grab_tuangou_coupons(token)
-        except Exception as e:
-            print(f"[团购] 执行异常: {e}")
+    # 保存历史记录
+    writer.add(
+        account_id=account['id'],
+        status=summary['status'],
+        success_count=summary['success'],
+        failed_count=summary['failed'],
+        details=summary['coupons'],
+        raw_output=summary['raw_output'],
+        limiter_wait_ms=summary['limiter_wait_ms']
+    )
     
-    raw_output = output_buffer.getvalue()
+    return summary['status'] == 'success'
+
+
+def print_account_header(account, log=print):
+    log(f"\n账号: {account['name']}")
+    log("-" * 50)
+
+
+async def run_grab_concurrently(accounts, writer, session=None, concurrency=DEFAULT_CONCURRENCY, log=print):
+    """并发执行所有 (账号, 活动) 组合，按账号顺序输出并保存结果"""
+    concurrency = max(1, concurrency)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='grab')
+    semaphore = asyncio.Semaphore(concurrency)
     
-    # 同时打印到控制台
-    print(raw_output)
+    campaigns = get_campaigns()
     
-    # 解析结果
-    parsed = parse_output(raw_output)
+    async def run_one(campaign, token, delay):
+        # 错开各账号的开始时间，等待期间不占用并发名额
+        if delay:
+            await asyncio.sleep(delay)
+        async with semaphore:
+            return await loop.run_in_executor(executor, grab_campaign, campaign, token, session)
     
-    # 判断状态
-    status = 'success' if (waimai_success or tuangou_success) else 'failed'
+    tasks = [
+        [asyncio.ensure_future(run_one(campaign, account['token'], delay)) for campaign in campaigns]
+        for account, delay in zip(accounts, start_delays(len(accounts)))
+    ]
     
-    # 保存历史记录
-    save_grab_history(
-        account_id=account_id,
-        status=status,
-        success_count=parsed['success'],
-        failed_count=parsed['failed'],
-        details=parsed['coupons'],
-        raw_output=raw_output
-    )
+    success_count = 0
+    try:
+        # 按原顺序等待每个账号的结果，保证输出和历史记录与顺序执行一致
+        for i, (account, account_tasks) in enumerate(zip(accounts, tasks), 1):
+            results = [await task for task in account_tasks]
+            log(f"\n[{i}/{len(accounts)}] 处理账号: {account['name']}")
+            print_account_header(account, log)
+            if finish_account(account, results, writer, log):
+                success_count += 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
     
-    return status == 'success'
+    return success_count
 
 
-def main():
-    """主函数：从数据库读取账号并执行领取"""
-    print("=" * 50)
-    print("美团红包定时任务 - 开始执行")
-    print(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 50)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='美团红包定时任务')
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'并发请求数，默认 {DEFAULT_CONCURRENCY}（环境变量 GRAB_CONCURRENCY）')
+    parser.add_argument('-b', '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'领取历史每批写入条数，默认 {DEFAULT_BATCH_SIZE}（环境变量 HISTORY_BATCH_SIZE）')
+    parser.add_argument('-l', '--log-file', default=os.environ.get('LOG_FILE'),
+                        help='同时写入按大小轮转的日志文件（环境变量 LOG_FILE），默认只输出到控制台')
+    return parser.parse_args(argv)
+
+
+def run_grab(session, concurrency=DEFAULT_CONCURRENCY, batch_size=DEFAULT_BATCH_SIZE, conn=None, log=print):
+    """
+    执行一轮领取，返回 (账号数, 成功账号数, 限流等待毫秒数)；
+    常驻的调度器传入复用的会话和数据库连接，以及写入执行日志的 log 函数（与 print 参数相同）
+    """
+    log("=" * 50)
+    log("美团红包定时任务 - 开始执行")
+    log(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    log("=" * 50)
     
     # 获取所有启用的账号
-    accounts = get_active_accounts()
+    accounts = get_active_accounts(conn, log)
     
     if not accounts:
         # 如果数据库中没有账号，尝试从环境变量获取
         token = os.environ.get('MEITUAN_TOKEN', '').strip()
         if token:
-            print("\n使用环境变量 MEITUAN_TOKEN")
+            log("\n使用环境变量 MEITUAN_TOKEN")
             tokens = [t.strip() for t in token.replace('\n', '&').split('&') if t.strip()]
             for i, tk in enumerate(tokens, 1):
-                print(f"\n环境变量账号 {i}/{len(tokens)}")
-                print("-" * 50)
-                grab_waimai_coupons(tk)
-                grab_tuangou_coupons(tk)
+                log(f"\n环境变量账号 {i}/{len(tokens)}")
+                log("-" * 50)
+                for result in grab_account(tk, session):
+                    log(result.format(), end='')
+            log(format_pool_stats(session))
         else:
-            print("\n[警告] 没有可执行的账号")
-            print("请通过 Web 控制台添加账号，或设置 MEITUAN_TOKEN 环境变量")
-        return
+            log("\n[警告] 没有可执行的账号")
+            log("请通过 Web 控制台添加账号，或设置 MEITUAN_TOKEN 环境变量")
+        return 0, 0, 0
     
-    print(f"\n找到 {len(accounts)} 个启用的账号")
+    log(f"\n找到 {len(accounts)} 个启用的账号，并发数: {concurrency}")
     
     # 执行领取
-    success_count = 0
-    for i, account in enumerate(accounts, 1):
-        print(f"\n[{i}/{len(accounts)}] 处理账号: {account['name']}")
-        
-        if run_grab_for_account(account):
-            success_count += 1
+    with HistoryWriter(batch_size=batch_size, conn=conn, log=log) as writer:
+        success_count = asyncio.run(run_grab_concurrently(accounts, writer, session=session, concurrency=concurrency, log=log))
+    
+    log("\n" + "=" * 50)
+    log(f"执行完成: {success_count}/{len(accounts)} 个账号成功")
+    log(format_pool_stats(session))
+    log(f"限流等待: {writer.limiter_wait_ms / 1000:.1f} 秒")
+    log("=" * 50)
+    return len(accounts), success_count, writer.limiter_wait_ms
+
+
+def main(argv=None):
+    """主函数：从数据库读取账号并执行领取"""
+    args = parse_args(argv)
+    if args.log_file:
+        redirect_output(args.log_file)
+    
+    # 数据库由 Web 控制台创建，这里只负责升级到最新结构
+    if os.path.exists(get_db_path()):
+        upgrade()
     
-    print("\n" + "=" * 50)
-    print(f"执行完成: {success_count}/{len(accounts)} 个账号成功")
-    print("=" * 50)
+    run_grab(create_session(max(POOL_SIZE, args.concurrency)), args.concurrency, args.batch_size)
 
 
 if __name__ == '__main__':
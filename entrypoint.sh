@@ -2,7 +2,7 @@
 
 # 美团红包自动领取 - Docker 入口脚本
 
-LOG_FILE="/var/log/meituan/coupons.log"
+export LOG_FILE="/var/log/meituan/coupons.log"
 
 # Token 可通过 Web 控制台添加，不再强制要求环境变量
 if [ -z "$MEITUAN_TOKEN" ]; then
@@ -17,31 +17,11 @@ echo "时区: $(date +%Z)"
 echo "当前时间: $(date '+%Y-%m-%d %H:%M:%S')"
 echo ""
 
-# 设置定时任务时间，默认 8:00 和 14:00
-CRON_HOURS="${CRON_HOURS:-8,14}"
-echo "定时执行时间: 每天 ${CRON_HOURS} 点"
-
-# 创建定时任务
-# 将环境变量写入文件供 cron 使用
-echo "MEITUAN_TOKEN=$MEITUAN_TOKEN" > /app/.env
-echo "DATA_DIR=/app/data" >> /app/.env
-echo "DB_PATH=/app/data/meituan.db" >> /app/.env
-
-# 创建 cron 任务 - 使用 cron_grab.py 从数据库读取账号
-CRON_SCHEDULE="0 ${CRON_HOURS} * * *"
-echo "${CRON_SCHEDULE} cd /app && export \$(cat /app/.env | xargs) && python cron_grab.py >> ${LOG_FILE} 2>&1" > /etc/crontabs/root
-
-echo "定时任务已配置: ${CRON_SCHEDULE}"
-echo ""
-
-# 是否立即执行一次
+# 定时任务由 scheduler.py 在进程内执行，执行时间以 Web 控制台中的配置为准，
+# 首次启动时使用 CRON_HOURS 初始化，默认 8:00 和 14:00
+echo "初始执行时间: 每天 ${CRON_HOURS:-8,14} 点（可在 Web 控制台修改）"
 if [ "$RUN_ON_START" = "true" ] || [ "$RUN_ON_START" = "1" ]; then
-    echo "正在立即执行一次..."
-    echo ""
-    # 使用 cron_grab.py 从数据库读取账号执行
-    python /app/cron_grab.py 2>&1 | tee -a ${LOG_FILE}
-    echo ""
-    echo "首次执行完成，等待下次定时任务..."
+    echo "启动后立即执行一次"
 else
     echo "提示: 设置 RUN_ON_START=true 可在启动时立即执行一次"
 fi
@@ -60,8 +40,12 @@ if [ "$ENABLE_WEB" = "true" ] || [ "$ENABLE_WEB" = "1" ]; then
     echo "访问地址: http://localhost:${WEB_PORT}"
     echo "=================================================="
 
-    # 后台启动 Web 服务
-    gunicorn -b 0.0.0.0:${WEB_PORT} -w 1 --timeout 120 web:app &
+    echo ""
+    echo "容器已启动，定时任务运行中..."
+    echo "使用 docker logs -f 查看日志"
+
+    # Web 服务前台运行，调度器运行在同一进程内，复用连接池；使用线程 worker，日志推送等长连接不会阻塞其他请求
+    ENABLE_SCHEDULER=true exec gunicorn -b 0.0.0.0:${WEB_PORT} -w 1 -k gthread --threads ${WEB_THREADS:-8} --timeout 120 web:app
 fi
 
 echo ""
@@ -70,5 +54,5 @@ echo "容器已启动，定时任务运行中..."
 echo "使用 docker logs -f 查看日志"
 echo "=================================================="
 
-# 启动 cron 守护进程（前台运行）
-crond -f -l 2
+# 未启用 Web 控制台时单独运行调度器（前台运行）
+exec python /app/scheduler.py
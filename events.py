@@ -0,0 +1,222 @@
+# -*- coding:utf-8 -*-
+"""
+控制台实时事件
+后台线程轮询数据库中新增的领取历史、系统日志和账号执行状态变化，
+Web 进程和定时任务写入的数据都能发现，再广播给 /api/events 的 SSE 订阅者。
+只在有订阅者时轮询，每个订阅者只收到自己有权限查看的事件。
+最近的事件保留在内存中，浏览器重连时按 Last-Event-ID 补发断开期间的事件，
+无法补全时发送 reset 让页面重新加载
+"""
+import os
+import time
+import uuid
+import queue
+import threading
+from collections import deque
+
+from cache import response_cache
+from storage import connect
+
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', '1.0'))
+# 每个订阅者最多积压的事件数，处理不过来的事件直接丢弃
+SUBSCRIBER_QUEUE_SIZE = 200
+POLL_BATCH_SIZE = 200
+# 保留用于断线补发的最近事件数
+REPLAY_BUFFER_SIZE = 1000
+# 最后一个订阅者断开后继续轮询的秒数，覆盖浏览器重连的间隔
+RESUME_GRACE = 60
+
+NEW_HISTORY_SQL = """
+    SELECT h.id, h.account_id, a.name, a.user_id, h.status, h.total_coupons, h.success_count, h.failed_count, h.grab_time
+    FROM grab_histories h
+    LEFT JOIN meituan_accounts a ON a.id = h.account_id
+    WHERE h.id > ?
+    ORDER BY h.id
+    LIMIT ?
+"""
+NEW_LOG_SQL = """
+    SELECT l.id, l.level, l.category, l.message, l.details, l.ip_address, u.username, l.user_id, l.created_at
+    FROM system_logs l
+    LEFT JOIN users u ON u.id = l.user_id
+    WHERE l.id > ?
+    ORDER BY l.id
+    LIMIT ?
+"""
+ACCOUNT_STATUS_SQL = 'SELECT id, user_id, name, last_run_status, last_run_at FROM meituan_accounts'
+
+
+def format_time(value):
+    return value[:19] if value else None
+
+
+class Subscriber:
+    def __init__(self, user_id, is_admin):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+        # 没有补发事件时连接开始处发送的位置，之后重连从这里继续
+        self.start_id = None
+
+    def can_see(self, owner_id):
+        return self.is_admin or owner_id == self.user_id
+
+    def get(self, timeout):
+        """返回 (事件类型, 数据, 事件 id)"""
+        return self.queue.get(timeout=timeout)
+
+    def deliver(self, event, data, event_id):
+        try:
+            self.queue.put_nowait((event, data, event_id))
+        except queue.Full:
+            self.dropped += 1
+
+
+class EventBroadcaster:
+    def __init__(self, db_path=None, interval=EVENTS_POLL_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        # 事件 id 为 "<进程标识>-<序号>"，进程重启后旧的 id 不再有效
+        self._epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._recent = deque(maxlen=REPLAY_BUFFER_SIZE)
+        # 轮询空闲停止时的序号，停止期间的变化没有记录
+        self._gap_seq = -1
+
+    def event_id(self, seq):
+        return f'{self._epoch}-{seq}'
+
+    def subscribe(self, user_id, is_admin=False, last_event_id=None) -> Subscriber:
+        """last_event_id 为浏览器重连时带上的 Last-Event-ID，补发之后的事件"""
+        subscriber = Subscriber(user_id, is_admin)
+        with self._lock:
+            # 补发和加入订阅在同一把锁内，与新事件的发布不会重复或遗漏
+            if not (last_event_id and self._replay(subscriber, last_event_id)):
+                subscriber.start_id = self.event_id(self._seq)
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='events', daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _replay(self, subscriber, last_event_id):
+        """在锁内调用：补发 last_event_id 之后的事件，无法补全时发送 reset，返回是否发送了事件"""
+        epoch, _, seq = last_event_id.partition('-')
+        seq = int(seq) if seq.isdigit() else -1
+        oldest = self._recent[0][0] if self._recent else self._seq + 1
+        missed = [item for item in self._recent if item[0] > seq and subscriber.can_see(item[3])]
+        if (epoch != self._epoch or not self._gap_seq < seq <= self._seq or oldest > seq + 1
+                or len(missed) > SUBSCRIBER_QUEUE_SIZE):
+            subscriber.deliver('reset', {}, self.event_id(self._seq))
+            return True
+        for item_seq, event, data, owner_id in missed:
+            subscriber.deliver(event, data, self.event_id(item_seq))
+        return bool(missed)
+
+    def publish(self, event, data, owner_id=None):
+        with self._lock:
+            self._seq += 1
+            self._recent.append((self._seq, event, data, owner_id))
+            event_id = self.event_id(self._seq)
+            for subscriber in self._subscribers:
+                if subscriber.can_see(owner_id):
+                    subscriber.deliver(event, data, event_id)
+
+    def _run(self):
+        conn = connect(self.db_path, readonly=True)
+        try:
+            positions = None
+            idle_since = None
+            while True:
+                with self._lock:
+                    if self._subscribers:
+                        idle_since = None
+                    elif idle_since is None:
+                        idle_since = time.monotonic()
+                    elif time.monotonic() - idle_since >= RESUME_GRACE:
+                        # 停止轮询后的变化不再记录，更早的位置无法补发；之后订阅的连接从新的序号开始
+                        positions = None
+                        self._gap_seq = self._seq
+                        self._seq += 1
+                        while not self._subscribers:
+                            self._wakeup.wait()
+                        idle_since = None
+                try:
+                    if positions is None:
+                        # 空闲后重新从当前位置开始，停止期间的变化无法补发
+                        positions = self.current_positions(conn)
+                    else:
+                        positions = self.poll(conn, *positions)
+                except Exception as e:
+                    print(f"Events error: {e}")
+                time.sleep(self.interval)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def current_positions(conn):
+        last_history_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM grab_histories').fetchone()[0]
+        last_log_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM system_logs').fetchone()[0]
+        account_states = {row[0]: row[3:] for row in conn.execute(ACCOUNT_STATUS_SQL)}
+        return last_history_id, last_log_id, account_states
+
+    def poll(self, conn, last_history_id, last_log_id, account_states):
+        """发布一轮新增的数据，返回新的位置"""
+        changed = False
+        for row in conn.execute(NEW_HISTORY_SQL, (last_history_id, POLL_BATCH_SIZE)).fetchall():
+            history_id, account_id, account_name, owner_id, status, total, success, failed, grab_time = row
+            self.publish('history', {
+                'id': history_id,
+                'account_id': account_id,
+                'account_name': account_name or 'Unknown',
+                'grab_time': format_time(grab_time),
+                'status': status,
+                'total_coupons': total,
+                'success_count': success,
+                'failed_count': failed
+            }, owner_id)
+            last_history_id = history_id
+            changed = True
+
+        for row in conn.execute(NEW_LOG_SQL, (last_log_id, POLL_BATCH_SIZE)).fetchall():
+            log_id, level, category, message, details, ip_address, username, owner_id, created_at = row
+            self.publish('log', {
+                'id': log_id,
+                'level': level,
+                'category': category,
+                'message': message,
+                'details': details,
+                'ip_address': ip_address,
+                'user': username,
+                'created_at': format_time(created_at)
+            }, owner_id)
+            last_log_id = log_id
+
+        states = {}
+        for account_id, owner_id, name, last_run_status, last_run_at in conn.execute(ACCOUNT_STATUS_SQL):
+            states[account_id] = (last_run_status, last_run_at)
+            if account_states.get(account_id) != states[account_id]:
+                self.publish('account', {
+                    'id': account_id,
+                    'name': name,
+                    'last_run_status': last_run_status,
+                    'last_run_at': format_time(last_run_at)
+                }, owner_id)
+                changed = True
+
+        # 定时任务的写入也让 Web 进程的响应缓存失效
+        if changed:
+            response_cache.invalidate('accounts', 'dashboard')
+        return last_history_id, last_log_id, states
+
+
+broadcaster = EventBroadcaster()
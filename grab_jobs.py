@@ -0,0 +1,144 @@
+# -*- coding:utf-8 -*-
+"""
+Web 控制台的后台领取任务
+/api/grab/run 提交任务后立即返回任务 ID，由后台线程执行并逐个账号记录进度
+"""
+import os
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+from cache import response_cache
+from models import db, MeituanAccount, GrabHistory, GrabJob, GrabJobResult, DailyGrabStat, SystemLog
+from meituan import create_session, grab_account, summarize_results, POOL_SIZE
+from rotating_log import get_log_writer
+from ratelimit import start_delays
+
+# 领取请求的工作线程数和单账号超时时间（秒）
+GRAB_WORKERS = int(os.environ.get('GRAB_WORKERS', '8'))
+GRAB_ACCOUNT_TIMEOUT = int(os.environ.get('GRAB_ACCOUNT_TIMEOUT', '120'))
+# 同时执行的任务数
+GRAB_JOB_WORKERS = int(os.environ.get('GRAB_JOB_WORKERS', '2'))
+
+grab_executor = ThreadPoolExecutor(max_workers=GRAB_WORKERS, thread_name_prefix='grab')
+job_executor = ThreadPoolExecutor(max_workers=GRAB_JOB_WORKERS, thread_name_prefix='grab-job')
+grab_session = create_session(max(POOL_SIZE, GRAB_WORKERS))
+
+
+def submit_job(app, user_id, accounts) -> GrabJob:
+    """创建领取任务并交给后台线程执行"""
+    job = GrabJob(id=uuid.uuid4().hex, user_id=user_id, status='pending', total=len(accounts))
+    db.session.add(job)
+    db.session.commit()
+    job_executor.submit(run_job, app, job.id, [a.id for a in accounts])
+    return job
+
+
+def run_job(app, job_id, account_ids):
+    with app.app_context():
+        job = db.session.get(GrabJob, job_id)
+        try:
+            execute_job(job, account_ids)
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.finished_at = datetime.now()
+            db.session.add(SystemLog(level='ERROR', category='grab', message=f'领取任务异常: {job_id}', details=str(e), user_id=job.user_id))
+            db.session.commit()
+
+
+def write_execution_log(text):
+    """手动领取的输出与定时任务一样写入执行日志，写入失败不影响任务"""
+    try:
+        get_log_writer().write(text)
+    except OSError as e:
+        print(f"Log error: {e}")
+
+
+def grab_account_at(start_at, token):
+    """到错开后的开始时间再领取，排队等待工作线程的时间也计入"""
+    delay = start_at - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    return grab_account(token, grab_session)
+
+
+def execute_job(job, account_ids):
+    accounts = MeituanAccount.query.filter(MeituanAccount.id.in_(account_ids)).all() if account_ids else []
+
+    now = datetime.now()
+    job.status = 'running'
+    job.started_at = now
+    job.total = len(accounts)
+    for account in accounts:
+        account.last_run_at = now
+        account.last_run_status = 'running'
+    db.session.commit()
+    response_cache.invalidate('accounts', 'dashboard')
+    write_execution_log(f"{'=' * 50}\nWeb 控制台手动领取 - 开始执行\n执行时间: {now.strftime('%Y-%m-%d %H:%M:%S')}\n{'=' * 50}\n")
+
+    started = time.monotonic()
+    start_times = [started + delay for delay in start_delays(len(accounts))]
+    futures = [
+        (account, start_at, grab_executor.submit(grab_account_at, start_at, account.token))
+        for account, start_at in zip(accounts, start_times)
+    ]
+
+    for account, start_at, future in futures:
+        item = GrabJobResult(job_id=job.id, account_id=account.id, account_name=account.name)
+        try:
+            # 超时时间从该账号错开后的开始时间算起
+            timeout = GRAB_ACCOUNT_TIMEOUT + max(start_at - time.monotonic(), 0)
+            summary = summarize_results(future.result(timeout=timeout))
+
+            history = GrabHistory(
+                account_id=account.id,
+                status=summary['status'],
+                total_coupons=summary['total'],
+                success_count=summary['success'],
+                failed_count=summary['failed'],
+                limiter_wait_ms=summary['limiter_wait_ms'],
+                details=json.dumps(summary['coupons'], ensure_ascii=False),
+                grab_time=datetime.now()
+            )
+            history.set_raw_output(summary['raw_output'])
+            write_execution_log(f"\n账号: {account.name}\n{'-' * 50}\n{summary['raw_output']}\n")
+            db.session.add(history)
+            DailyGrabStat.record(history)
+            account.last_run_status = summary['status']
+            item.status = summary['status']
+            item.success_count = summary['success']
+            item.failed_count = summary['failed']
+
+        except FutureTimeoutError:
+            # 线程无法强制终止，未开始的任务直接取消，已开始的任务结果将被丢弃
+            future.cancel()
+            account.last_run_status = 'timeout'
+            item.status = 'timeout'
+            item.error = '执行超时'
+        except Exception as e:
+            account.last_run_status = 'failed'
+            item.status = 'failed'
+            item.error = str(e)
+
+        # 逐个账号提交，进度接口可以读取到部分结果
+        db.session.add(item)
+        job.completed += 1
+        db.session.commit()
+        response_cache.invalidate('accounts', 'dashboard')
+
+    job.status = 'completed'
+    job.finished_at = datetime.now()
+    db.session.add(SystemLog(level='INFO', category='grab', message=f'领取任务完成，账号数: {len(accounts)}', user_id=job.user_id))
+    db.session.commit()
+
+
+def recover_interrupted_jobs(app):
+    """进程重启后，将未完成的任务标记为中断"""
+    with app.app_context():
+        GrabJob.query.filter(GrabJob.status.in_(['pending', 'running'])).update(
+            {'status': 'interrupted', 'finished_at': datetime.now()}, synchronize_session=False
+        )
+        db.session.commit()
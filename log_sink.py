@@ -0,0 +1,124 @@
+# -*- coding:utf-8 -*-
+"""
+系统日志的异步写入
+请求线程只把日志放入队列，后台线程按条数或时间阈值批量写入 system_logs，
+日志落盘不再影响请求耗时；队列满时丢弃并计数，进程退出前写完剩余日志
+"""
+import os
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+from storage import connect
+
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', '100'))
+# 最长攒批时间（秒）
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '1.0'))
+
+INSERT_LOG_SQL = """
+    INSERT INTO system_logs (level, category, message, details, ip_address, user_id, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class LogSink:
+    def __init__(self, db_path=None, maxsize=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE, interval=LOG_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start(self, db_path=None):
+        with self._lock:
+            if db_path:
+                self.db_path = db_path
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-sink', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        return self
+
+    def put(self, level, category, message, details=None, ip_address=None, user_id=None):
+        """非阻塞入队，返回是否成功"""
+        # 与 SQLAlchemy DateTime 的存储格式一致
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        try:
+            self._queue.put_nowait((level, category, message, details, ip_address, user_id, created_at))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _drain(self, block, limit):
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.interval))
+            while len(batch) < limit:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, conn, batch):
+        try:
+            with conn:
+                conn.executemany(INSERT_LOG_SQL, batch)
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self.dropped += len(batch)
+            print(f"Log error: {e}")
+
+    def _run(self):
+        conn = connect(self.db_path)
+        try:
+            while not self._stop.is_set():
+                # 先等第一条，再在时间窗口内攒够一批
+                batch = self._drain(True, self.batch_size)
+                if batch and len(batch) < self.batch_size:
+                    self._stop.wait(self.interval)
+                    batch += self._drain(False, self.batch_size - len(batch))
+                if batch:
+                    self._write(conn, batch)
+            while True:
+                batch = self._drain(False, self.batch_size)
+                if not batch:
+                    break
+                self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def close(self, timeout=10):
+        """停止后台线程并写完队列中的日志"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'maxsize': self._queue.maxsize,
+                'written': self.written,
+                'dropped': self.dropped,
+                'batches': self.batches,
+                'errors': self.errors
+            }
+
+
+log_sink = LogSink()
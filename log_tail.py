@@ -0,0 +1,97 @@
+# -*- coding:utf-8 -*-
+"""
+执行日志文件的读取
+tail_lines 从文件末尾按块倒序读取，只读需要的部分，当前文件行数不够时继续读取轮转的压缩文件；
+follow 从指定字节偏移开始持续读取新追加的完整行，供 SSE 推送和断点续传
+"""
+import os
+import time
+
+from rotating_log import LOG_BACKUP_COUNT, read_generation
+
+TAIL_BLOCK_SIZE = 8192
+# 跟随模式的轮询间隔和心跳间隔（秒）
+FOLLOW_POLL_INTERVAL = float(os.environ.get('LOG_FOLLOW_POLL_INTERVAL', '1.0'))
+FOLLOW_HEARTBEAT = 15
+
+
+def tail_lines(path, lines, block_size=TAIL_BLOCK_SIZE):
+    """返回文件最后 lines 行的文本和当前文件末尾的字节偏移"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        position = end
+        blocks = []
+        newlines = 0
+        # 多读一个换行，保证最前面的一行是完整的
+        while position > 0 and newlines <= lines:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            blocks.append(block)
+            newlines += block.count(b'\n')
+    data = b''.join(reversed(blocks))
+    # 当前文件已读完仍不够时，从最近一次轮转的文件开始往前补
+    generation = 1
+    while position == 0 and newlines <= lines and generation <= LOG_BACKUP_COUNT:
+        previous = read_generation(path, generation)
+        if previous is None:
+            break
+        data = previous + data
+        newlines += previous.count(b'\n')
+        generation += 1
+    parts = data.splitlines(keepends=True)
+    content = b''.join(parts[-lines:]) if lines > 0 else b''
+    return content.decode('utf-8', errors='ignore'), end
+
+
+def follow(path, offset=None, timeout=None, poll_interval=FOLLOW_POLL_INTERVAL):
+    """
+    从 offset 开始跟随文件追加的内容，产出 (文本, 新偏移)；
+    没有新内容时按心跳间隔产出 (None, 偏移)。
+    保持旧文件句柄打开，文件轮转后先读完旧文件剩余的内容，再从新文件开头继续
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    last_yield = time.monotonic()
+    handle = None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            if handle is None and os.path.exists(path):
+                handle = open(path, 'rb')
+                size = os.fstat(handle.fileno()).st_size
+                if offset is None or offset > size:
+                    offset = size if offset is None else 0
+            if handle is not None:
+                handle.seek(offset)
+                data = handle.read()
+                try:
+                    rotated = os.stat(path).st_ino != os.fstat(handle.fileno()).st_ino
+                except FileNotFoundError:
+                    rotated = True
+                if rotated:
+                    # 改名后旧文件不会再有写入，读到末尾后切换到新文件
+                    data += handle.read()
+                    handle.close()
+                    handle = None
+                    if data:
+                        last_yield = time.monotonic()
+                        yield data.decode('utf-8', errors='ignore') + ('' if data.endswith(b'\n') else '\n'), 0
+                    offset = 0
+                    continue
+                # 只推送完整的行，未写完的行留到下一次
+                complete = data.rfind(b'\n') + 1
+                if complete:
+                    offset += complete
+                    last_yield = time.monotonic()
+                    yield data[:complete].decode('utf-8', errors='ignore'), offset
+                    continue
+                if os.fstat(handle.fileno()).st_size < offset:
+                    offset = 0
+            if time.monotonic() - last_yield >= FOLLOW_HEARTBEAT:
+                last_yield = time.monotonic()
+                yield None, offset
+            time.sleep(poll_interval)
+    finally:
+        if handle is not None:
+            handle.close()
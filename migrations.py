@@ -0,0 +1,175 @@
+# -*- coding:utf-8 -*-
+"""
+数据库结构迁移
+db.create_all 只会创建缺失的表，不会修改已有的表和索引。
+迁移按版本号顺序执行，当前版本记录在 PRAGMA user_version 中，
+已有的 meituan.db 启动时会原地升级。
+"""
+import os
+
+from storage import connect, compress_text, get_db_path
+
+# 迁移 3 每批压缩的行数
+COMPRESS_BATCH_SIZE = 500
+
+
+def compress_raw_outputs(conn):
+    """将 grab_histories.raw_output 压缩后移入 grab_raw_outputs"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, raw_output FROM grab_histories WHERE id > ? AND raw_output IS NOT NULL ORDER BY id LIMIT ?',
+            (last_id, COMPRESS_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            'INSERT OR REPLACE INTO grab_raw_outputs (history_id, data) VALUES (?, ?)',
+            [(history_id, compress_text(raw_output)) for history_id, raw_output in rows]
+        )
+        conn.executemany('UPDATE grab_histories SET raw_output = NULL WHERE id = ?', [(history_id,) for history_id, _ in rows])
+        last_id = rows[-1][0]
+
+
+# 维护版本号的表，任何行变化都会让 table_versions 中对应的版本号加一，用于生成 ETag
+VERSIONED_TABLES = ['meituan_accounts', 'grab_histories', 'daily_grab_stats', 'system_configs']
+
+
+def version_trigger_steps():
+    steps = [
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name VARCHAR(50) NOT NULL PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+    ]
+    for table in VERSIONED_TABLES:
+        steps.append(f"INSERT OR IGNORE INTO table_versions (name, version) VALUES ('{table}', 0)")
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            steps.append(
+                f"CREATE TRIGGER IF NOT EXISTS tv_{table}_{operation.lower()} AFTER {operation} ON {table} "
+                f"BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; END"
+            )
+    return steps
+
+
+def add_column(table, column, definition):
+    """新建的数据库已由 create_all 建好该列，只为已有数据库添加"""
+    def step(conn):
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return step
+
+
+# (版本号, 说明, 步骤)，步骤为 SQL 字符串或接收 sqlite3 连接的函数
+MIGRATIONS = [
+    (1, '热点查询索引', [
+        'CREATE INDEX IF NOT EXISTS ix_grab_histories_account_time ON grab_histories (account_id, grab_time)',
+        'CREATE INDEX IF NOT EXISTS ix_grab_histories_time ON grab_histories (grab_time)',
+        'CREATE INDEX IF NOT EXISTS ix_system_logs_user_time ON system_logs (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_system_logs_level_time ON system_logs (level, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_system_logs_category_time ON system_logs (category, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_system_logs_time ON system_logs (created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_meituan_accounts_user_active ON meituan_accounts (user_id, is_active)',
+        'CREATE INDEX IF NOT EXISTS ix_meituan_accounts_token_user ON meituan_accounts (token, user_id)',
+    ]),
+    (2, '按日汇总的领取统计', [
+        """
+        CREATE TABLE IF NOT EXISTS daily_grab_stats (
+            account_id INTEGER NOT NULL REFERENCES meituan_accounts (id),
+            day DATE NOT NULL,
+            runs INTEGER DEFAULT 0,
+            success_count INTEGER DEFAULT 0,
+            failed_count INTEGER DEFAULT 0,
+            total_coupons INTEGER DEFAULT 0,
+            PRIMARY KEY (account_id, day)
+        )
+        """,
+        # 从已有历史回填，REPLACE 保证重复执行结果一致
+        """
+        INSERT OR REPLACE INTO daily_grab_stats (account_id, day, runs, success_count, failed_count, total_coupons)
+        SELECT account_id, date(grab_time), COUNT(*),
+               COALESCE(SUM(success_count), 0), COALESCE(SUM(failed_count), 0), COALESCE(SUM(total_coupons), 0)
+        FROM grab_histories
+        GROUP BY account_id, date(grab_time)
+        """,
+    ]),
+    (3, '原始输出压缩存储', [
+        """
+        CREATE TABLE IF NOT EXISTS grab_raw_outputs (
+            history_id INTEGER NOT NULL REFERENCES grab_histories (id),
+            data BLOB NOT NULL,
+            PRIMARY KEY (history_id)
+        )
+        """,
+        compress_raw_outputs,
+    ]),
+    # auto_vacuum 只有在 VACUUM 重建后才生效；大数据库的 VACUUM 耗时较长，
+    # 不在启动时执行，由 retention.py 的后台清理线程完成一次性重建
+    (4, '启用增量 VACUUM', [
+        'PRAGMA auto_vacuum = INCREMENTAL',
+    ]),
+    (5, '表版本号触发器', version_trigger_steps()),
+    (6, '记录限流等待时间', [
+        add_column('grab_histories', 'limiter_wait_ms', 'INTEGER DEFAULT 0'),
+    ]),
+]
+
+# auto_vacuum 需在事务外设置，这些版本的步骤逐条自动提交，步骤本身需可重复执行
+NON_TRANSACTIONAL = {4}
+
+LATEST_VERSION = max(version for version, _, _ in MIGRATIONS)
+
+
+def has_base_schema(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'grab_histories'").fetchone() is not None
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def upgrade(db_path=None, verbose=False):
+    """将数据库升级到最新版本，返回执行的迁移版本列表"""
+    # 基础表由 Web 控制台的 init_db 创建，数据库或表还不存在时不做任何操作
+    if not os.path.exists(db_path or get_db_path()):
+        return []
+    conn = connect(db_path)
+    conn.isolation_level = None
+    applied = []
+    try:
+        if not has_base_schema(conn):
+            return []
+        current = get_version(conn)
+        for version, description, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            # 每个版本一个事务，失败时回滚并停止后续迁移
+            transactional = version not in NON_TRANSACTIONAL
+            if transactional:
+                conn.execute('BEGIN IMMEDIATE')
+            try:
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f'PRAGMA user_version = {version}')
+                if transactional:
+                    conn.execute('COMMIT')
+            except Exception:
+                if transactional:
+                    conn.execute('ROLLBACK')
+                raise
+            applied.append(version)
+            if verbose:
+                print(f"数据库迁移 v{version}: {description}")
+    finally:
+        conn.close()
+    return applied
+
+
+if __name__ == '__main__':
+    upgrade(verbose=True)
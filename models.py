@@ -3,6 +3,10 @@ import hashlib
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 
+from cache import response_cache
+from storage import install_pragmas, compress_text, decompress_text, UPSERT_DAILY_STATS_SQL
+from migrations import upgrade
+
 db = SQLAlchemy()
 
 
@@ -53,6 +57,7 @@ class MeituanAccount(db.Model):
     last_run_status = db.Column(db.String(20))
 
     grab_histories = db.relationship('GrabHistory', backref='account', lazy='dynamic', cascade='all, delete-orphan')
+    daily_stats = db.relationship('DailyGrabStat', lazy='dynamic', cascade='all, delete-orphan')
 
     def to_dict(self):
         return {
@@ -80,7 +85,20 @@ class GrabHistory(db.Model):
     success_count = db.Column(db.Integer, default=0)
     failed_count = db.Column(db.Integer, default=0)
     details = db.Column(db.Text)
-    raw_output = db.Column(db.Text)
+    # 本次领取等待限流令牌的总时间（毫秒）
+    limiter_wait_ms = db.Column(db.Integer, default=0)
+    # 旧版本直接存储的原始输出，迁移后为空，新记录写入 grab_raw_outputs
+    raw_output = db.deferred(db.Column(db.Text))
+
+    raw = db.relationship('GrabRawOutput', uselist=False, cascade='all, delete-orphan')
+
+    def set_raw_output(self, text: str):
+        self.raw = GrabRawOutput(data=compress_text(text))
+
+    def get_raw_output(self) -> str:
+        if self.raw is not None:
+            return decompress_text(self.raw.data)
+        return self.raw_output or ''
 
     def to_dict(self):
         return {
@@ -92,10 +110,65 @@ class GrabHistory(db.Model):
             'total_coupons': self.total_coupons,
             'success_count': self.success_count,
             'failed_count': self.failed_count,
-            'details': self.details,
-            'raw_output': self.raw_output
+            'limiter_wait_ms': self.limiter_wait_ms or 0,
+            'details': self.details
         }
 
+    @staticmethod
+    def list_query(session):
+        """列表用的投影查询，一次 JOIN 取出账号名，避免逐行懒加载"""
+        return session.query(
+            GrabHistory.id, GrabHistory.account_id, MeituanAccount.name.label('account_name'),
+            GrabHistory.grab_time, GrabHistory.status, GrabHistory.total_coupons,
+            GrabHistory.success_count, GrabHistory.failed_count, GrabHistory.limiter_wait_ms, GrabHistory.details
+        ).outerjoin(MeituanAccount, GrabHistory.account_id == MeituanAccount.id)
+
+    @staticmethod
+    def row_to_dict(row):
+        return {
+            'id': row.id,
+            'account_id': row.account_id,
+            'account_name': row.account_name or 'Unknown',
+            'grab_time': row.grab_time.strftime('%Y-%m-%d %H:%M:%S') if row.grab_time else None,
+            'status': row.status,
+            'total_coupons': row.total_coupons,
+            'success_count': row.success_count,
+            'failed_count': row.failed_count,
+            'limiter_wait_ms': row.limiter_wait_ms or 0,
+            'details': row.details
+        }
+
+
+class GrabRawOutput(db.Model):
+    """领取原始输出，zlib 压缩后单独存储，仅在查看详情时加载"""
+    __tablename__ = 'grab_raw_outputs'
+
+    history_id = db.Column(db.Integer, db.ForeignKey('grab_histories.id'), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+
+class DailyGrabStat(db.Model):
+    """按 (账号, 日期) 汇总的领取统计，写入领取历史时增量更新"""
+    __tablename__ = 'daily_grab_stats'
+
+    account_id = db.Column(db.Integer, db.ForeignKey('meituan_accounts.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    runs = db.Column(db.Integer, default=0)
+    success_count = db.Column(db.Integer, default=0)
+    failed_count = db.Column(db.Integer, default=0)
+    total_coupons = db.Column(db.Integer, default=0)
+
+    @staticmethod
+    def record(history):
+        """在当前事务中累加一条领取历史"""
+        db.session.execute(db.text(UPSERT_DAILY_STATS_SQL), {
+            'account_id': history.account_id,
+            'day': (history.grab_time or datetime.now()).strftime('%Y-%m-%d'),
+            'success_count': history.success_count or 0,
+            'failed_count': history.failed_count or 0,
+            'total_coupons': history.total_coupons or 0
+        })
+
 
 class SystemLog(db.Model):
     __tablename__ = 'system_logs'
@@ -121,6 +194,79 @@ class SystemLog(db.Model):
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
         }
 
+    @staticmethod
+    def list_query(session):
+        """列表用的投影查询，一次 JOIN 取出用户名，避免逐行懒加载"""
+        return session.query(
+            SystemLog.id, SystemLog.level, SystemLog.category, SystemLog.message, SystemLog.details,
+            SystemLog.ip_address, User.username, SystemLog.created_at
+        ).outerjoin(User, SystemLog.user_id == User.id)
+
+    @staticmethod
+    def row_to_dict(row):
+        return {
+            'id': row.id,
+            'level': row.level,
+            'category': row.category,
+            'message': row.message,
+            'details': row.details,
+            'ip_address': row.ip_address,
+            'user': row.username,
+            'created_at': row.created_at.strftime('%Y-%m-%d %H:%M:%S') if row.created_at else None
+        }
+
+
+class GrabJob(db.Model):
+    __tablename__ = 'grab_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    total = db.Column(db.Integer, default=0)
+    completed = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    results = db.relationship('GrabJobResult', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+
+    def to_dict(self, include_results=False):
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'progress': round(self.completed * 100 / self.total, 1) if self.total else 100.0,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+        if include_results:
+            data['results'] = [r.to_dict() for r in self.results.order_by(GrabJobResult.id)]
+        return data
+
+
+class GrabJobResult(db.Model):
+    __tablename__ = 'grab_job_results'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('grab_jobs.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer)
+    account_name = db.Column(db.String(100))
+    status = db.Column(db.String(20), nullable=False)
+    success_count = db.Column(db.Integer, default=0)
+    failed_count = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+
+    def to_dict(self):
+        data = {'account': self.account_name, 'status': self.status}
+        if self.error:
+            data['error'] = self.error
+        else:
+            data['success'] = self.success_count
+            data['failed'] = self.failed_count
+        return data
+
 
 class SystemConfig(db.Model):
     __tablename__ = 'system_configs'
@@ -147,13 +293,17 @@ class SystemConfig(db.Model):
             config = SystemConfig(key=key, value=value, description=description)
             db.session.add(config)
         db.session.commit()
+        response_cache.invalidate('config', 'dashboard')
         return config
 
 
 def init_db(app):
     db.init_app(app)
     with app.app_context():
+        install_pragmas(db.engine)
         db.create_all()
+        # 索引等结构变更通过版本化迁移添加，已有数据库也会升级
+        upgrade(db.engine.url.database)
 
         admin = User.query.filter_by(username='admin').first()
         if not admin:
@@ -166,6 +316,8 @@ def init_db(app):
             ('cron_hours', os.environ.get('CRON_HOURS', '8,14'), '定时执行时间'),
             ('run_on_start', os.environ.get('RUN_ON_START', 'false'), '启动时执行'),
             ('auto_refresh_interval', '30', '自动刷新间隔'),
+            ('history_retention_days', os.environ.get('HISTORY_RETENTION_DAYS', '90'), '领取历史保留天数'),
+            ('log_retention_days', os.environ.get('LOG_RETENTION_DAYS', '90'), '系统日志保留天数'),
         ]
         for key, value, desc in default_configs:
             if not SystemConfig.query.filter_by(key=key).first():
@@ -0,0 +1,104 @@
+# -*- coding:utf-8 -*-
+"""
+领取请求的按主机令牌桶限流
+同一进程内的定时领取和 Web 控制台手动领取共用一个限流器，
+设置 GRAB_RATE_LIMIT 后每个主机每秒最多发出该数量的请求，允许 GRAB_RATE_BURST 个突发；
+各账号的开始时间可以在 GRAB_START_JITTER 秒内错开，避免整点同时请求
+"""
+import os
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+# 每个主机每秒的请求数，默认 0 不限流
+GRAB_RATE_LIMIT = float(os.environ.get('GRAB_RATE_LIMIT', '0'))
+GRAB_RATE_BURST = int(os.environ.get('GRAB_RATE_BURST', '10'))
+# 账号开始时间的错开窗口（秒），0 表示同时开始
+GRAB_START_JITTER = float(os.environ.get('GRAB_START_JITTER', '0'))
+
+
+class TokenBucket:
+    """令牌不足时预支后续令牌并返回需要等待的时间，等待的请求按到达顺序依次放行"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.requests = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.requests += 1
+            if wait:
+                self.delayed += 1
+                self.total_wait += wait
+            return wait
+
+    def acquire(self):
+        """取得一个令牌，返回等待的秒数"""
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'requests': self.requests,
+                'delayed': self.delayed,
+                'total_wait_ms': round(self.total_wait * 1000)
+            }
+
+
+class HostRateLimiter:
+    def __init__(self, rate=GRAB_RATE_LIMIT, burst=GRAB_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def acquire(self, url):
+        """按 URL 的主机限流，返回等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        return self.bucket(urlsplit(url).netloc).acquire()
+
+    def stats(self):
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'start_jitter': GRAB_START_JITTER,
+            'hosts': {host: bucket.stats() for host, bucket in buckets.items()}
+        }
+
+
+def start_delays(count, window=None):
+    """将 count 个账号的开始时间均匀错开到 window 秒内，每个账号在自己的时间段内随机开始"""
+    window = GRAB_START_JITTER if window is None else window
+    if window <= 0 or count <= 1:
+        return [0.0] * count
+    slot = window / count
+    return [(i + random.random()) * slot for i in range(count)]
+
+
+rate_limiter = HostRateLimiter()
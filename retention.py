@@ -0,0 +1,296 @@
+# -*- coding:utf-8 -*-
+"""
+领取历史和系统日志的保留期清理
+超过保留天数的记录按月追加到 gzip 压缩的 JSON Lines 归档文件后分批删除，
+每批删除只短暂持有写锁，删除后用 incremental_vacuum 分批回收空间。
+已有数据库需要 VACUUM 重建一次才能启用增量回收：重建期间持有写锁，其他写入在忙等超时后失败，
+并且需要与数据库同样大小的额外磁盘空间，因此不自动执行，由管理员在空闲时通过
+/api/admin/vacuum 或 python retention.py --vacuum 触发。
+保留天数读取 system_configs 中的 history_retention_days / log_retention_days，0 表示不清理。
+
+用法: python retention.py [--vacuum]  立即执行一次清理，或执行一次性 VACUUM 重建
+"""
+import os
+import re
+import json
+import gzip
+import time
+import argparse
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+from storage import connect, decompress_text, get_data_dir, get_db_path
+
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(get_data_dir(), 'archive'))
+# 每批归档删除的行数，需小于 SQLite 的参数个数上限
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+# 后台清理间隔（小时），0 表示不启动后台线程
+RETENTION_INTERVAL_HOURS = float(os.environ.get('RETENTION_INTERVAL_HOURS', '6'))
+DEFAULT_RETENTION_DAYS = 90
+# 每次 incremental_vacuum 回收的页数，批次之间让出写锁
+VACUUM_PAGES = 1000
+BATCH_PAUSE = 0.05
+# 一次性 VACUUM 与下次定时领取之间至少间隔的分钟数
+VACUUM_MIN_IDLE_MINUTES = 30
+
+ARCHIVE_FILE_PATTERN = re.compile(r'^(grab_histories|system_logs)-(\d{4}-\d{2})\.jsonl\.gz$')
+
+ARCHIVE_TABLES = {
+    'grab_histories': {
+        'config': 'history_retention_days',
+        'time_column': 'grab_time',
+        'select': """
+            SELECT h.id, h.account_id, a.name AS account_name, h.status, h.total_coupons, h.success_count,
+                   h.failed_count, h.limiter_wait_ms, h.details, h.grab_time, r.data AS raw_data, h.raw_output
+            FROM grab_histories h
+            LEFT JOIN meituan_accounts a ON a.id = h.account_id
+            LEFT JOIN grab_raw_outputs r ON r.history_id = h.id
+            WHERE h.grab_time < ?
+            ORDER BY h.id
+            LIMIT ?
+        """,
+        'delete': [
+            'DELETE FROM grab_raw_outputs WHERE history_id IN ({})',
+            'DELETE FROM grab_histories WHERE id IN ({})',
+        ],
+    },
+    'system_logs': {
+        'config': 'log_retention_days',
+        'time_column': 'created_at',
+        'select': """
+            SELECT l.id, l.level, l.category, l.message, l.details, l.ip_address, l.user_id,
+                   u.username, l.created_at
+            FROM system_logs l
+            LEFT JOIN users u ON u.id = l.user_id
+            WHERE l.created_at < ?
+            ORDER BY l.id
+            LIMIT ?
+        """,
+        'delete': [
+            'DELETE FROM system_logs WHERE id IN ({})',
+        ],
+    },
+}
+
+# 最近一次清理的结果，供管理接口查看
+last_result = {}
+# 一次性 VACUUM 的执行状态
+vacuum_state = {}
+_vacuum_lock = threading.Lock()
+
+
+def get_retention_days(conn, key):
+    row = conn.execute('SELECT value FROM system_configs WHERE key = ?', (key,)).fetchone()
+    try:
+        return max(int(row[0]), 0) if row else DEFAULT_RETENTION_DAYS
+    except (TypeError, ValueError):
+        return DEFAULT_RETENTION_DAYS
+
+
+def fetch_expired(conn, table, cutoff):
+    cursor = conn.execute(ARCHIVE_TABLES[table]['select'], (cutoff, ARCHIVE_BATCH_SIZE))
+    columns = [c[0] for c in cursor.description]
+    rows = [dict(zip(columns, values)) for values in cursor.fetchall()]
+    for row in rows:
+        if 'raw_data' in row:
+            # 原始输出解压后写入归档，兼容尚未迁移的旧行
+            raw_data = row.pop('raw_data')
+            row['raw_output'] = decompress_text(raw_data) if raw_data else (row['raw_output'] or '')
+    return rows
+
+
+def write_archive(archive_dir, table, rows):
+    """按月份追加到归档文件，每次追加是一个独立的 gzip member"""
+    time_column = ARCHIVE_TABLES[table]['time_column']
+    months = {}
+    for row in rows:
+        row[time_column] = (row[time_column] or '')[:19]
+        months.setdefault(row[time_column][:7] or '0000-00', []).append(row)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    for month, items in months.items():
+        path = os.path.join(archive_dir, f'{table}-{month}.jsonl.gz')
+        with open(path, 'ab') as raw_file:
+            with gzip.GzipFile(fileobj=raw_file, mode='ab') as f:
+                f.write(''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in items).encode('utf-8'))
+            raw_file.flush()
+            os.fsync(raw_file.fileno())
+
+
+def archive_table(conn, table, days, archive_dir):
+    """归档并删除超过保留期的行，返回处理的行数"""
+    cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    archived = 0
+    while True:
+        rows = fetch_expired(conn, table, cutoff)
+        if not rows:
+            break
+        # 先落盘归档再删除，中途退出时归档里可能有重复行，读取时按 id 去重
+        write_archive(archive_dir, table, rows)
+        ids = [row['id'] for row in rows]
+        placeholders = ','.join('?' * len(ids))
+        with conn:
+            for sql in ARCHIVE_TABLES[table]['delete']:
+                conn.execute(sql.format(placeholders), ids)
+        archived += len(rows)
+        time.sleep(BATCH_PAUSE)
+    return archived
+
+
+def enable_incremental_vacuum(conn, db_path=None):
+    """数据库还未启用增量回收时执行一次 VACUUM 重建，返回是否已启用"""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return True
+    # VACUUM 先把整个数据库写入 WAL 再检查点，磁盘上临时需要约一倍的空间
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    db_size = conn.execute('PRAGMA page_count').fetchone()[0] * page_size
+    free = shutil.disk_usage(os.path.dirname(os.path.abspath(db_path or get_db_path()))).free
+    if free < db_size * 1.1:
+        print(f"[警告] 磁盘剩余空间不足，暂不执行 VACUUM（需要约 {db_size // 1024 // 1024} MB）")
+        return False
+    print(f"正在执行 VACUUM 启用增量空间回收（{db_size // 1024 // 1024} MB），期间其他写入会在忙等超时后失败")
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+
+def incremental_vacuum_enabled(db_path=None):
+    # 使用新连接读取，连接池中已打开的连接会缓存 VACUUM 之前的设置
+    conn = connect(db_path, readonly=True)
+    try:
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        conn.close()
+
+
+def start_vacuum(db_path=None):
+    """在后台线程执行一次性 VACUUM 重建，已在执行时返回 False，结果记录在 vacuum_state"""
+    if not _vacuum_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        vacuum_state.clear()
+        vacuum_state.update({'status': 'running', 'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+        try:
+            conn = connect(db_path)
+            try:
+                enabled = enable_incremental_vacuum(conn, db_path)
+            finally:
+                conn.close()
+            vacuum_state['status'] = 'completed' if enabled else 'skipped'
+        except Exception as e:
+            vacuum_state.update({'status': 'failed', 'error': str(e)})
+        finally:
+            vacuum_state['finished_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            _vacuum_lock.release()
+
+    threading.Thread(target=run, name='vacuum', daemon=True).start()
+    return True
+
+
+def reclaim_space(conn):
+    """分批执行 incremental_vacuum，返回回收的页数"""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return 0
+    freed = 0
+    free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    while free_pages:
+        conn.execute(f'PRAGMA incremental_vacuum({VACUUM_PAGES})').fetchall()
+        remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if remaining >= free_pages:
+            break
+        freed += free_pages - remaining
+        free_pages = remaining
+        time.sleep(BATCH_PAUSE)
+    return freed
+
+
+def run_retention(db_path=None, archive_dir=None):
+    """按保留期归档所有表，返回各表归档行数和回收页数"""
+    conn = connect(db_path)
+    try:
+        result = {'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        for table, spec in ARCHIVE_TABLES.items():
+            days = get_retention_days(conn, spec['config'])
+            result[table] = archive_table(conn, table, days, archive_dir or ARCHIVE_DIR) if days else 0
+        result['freed_pages'] = reclaim_space(conn) if any(result[t] for t in ARCHIVE_TABLES) else 0
+        result['finished_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    finally:
+        conn.close()
+    last_result.clear()
+    last_result.update(result)
+    return result
+
+
+def start_archiver(db_path=None, interval_hours=RETENTION_INTERVAL_HOURS):
+    """启动后台清理线程，启动时先执行一次"""
+    if interval_hours <= 0:
+        return None
+
+    def loop():
+        while True:
+            try:
+                result = run_retention(db_path)
+                if any(result[t] for t in ARCHIVE_TABLES):
+                    print(f"数据归档: {', '.join(f'{t}={result[t]}' for t in ARCHIVE_TABLES)}，回收 {result['freed_pages']} 页")
+            except Exception as e:
+                print(f"Retention error: {e}")
+            time.sleep(interval_hours * 3600)
+
+    thread = threading.Thread(target=loop, name='retention', daemon=True)
+    thread.start()
+    return thread
+
+
+def list_archives(archive_dir=None):
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not os.path.isdir(archive_dir):
+        return []
+    archives = []
+    for name in sorted(os.listdir(archive_dir)):
+        match = ARCHIVE_FILE_PATTERN.match(name)
+        if match:
+            archives.append({
+                'table': match.group(1),
+                'month': match.group(2),
+                'size': os.path.getsize(os.path.join(archive_dir, name))
+            })
+    return archives
+
+
+def read_archive(table, month, filters=None, keyword=None, archive_dir=None):
+    """读取某月归档，按字段值和关键字过滤，按 id 倒序返回；文件不存在时返回 None"""
+    name = f'{table}-{month}.jsonl.gz'
+    if not ARCHIVE_FILE_PATTERN.match(name):
+        return None
+    path = os.path.join(archive_dir or ARCHIVE_DIR, name)
+    if not os.path.exists(path):
+        return None
+
+    filters = {k: str(v) for k, v in (filters or {}).items() if v not in (None, '')}
+    rows = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            if any(str(row.get(k)) != v for k, v in filters.items()):
+                continue
+            if keyword and keyword not in f"{row.get('message') or ''} {row.get('details') or ''}":
+                continue
+            rows[row['id']] = row
+    return [rows[k] for k in sorted(rows, reverse=True)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='领取历史和系统日志的保留期清理')
+    parser.add_argument('--vacuum', action='store_true', help='执行一次性 VACUUM 重建以启用增量空间回收，请在没有领取任务时执行')
+    args = parser.parse_args()
+    if args.vacuum:
+        conn = connect()
+        try:
+            print('已启用增量空间回收' if enable_incremental_vacuum(conn) else '未执行 VACUUM')
+        finally:
+            conn.close()
+    else:
+        print(json.dumps(run_retention(), ensure_ascii=False))
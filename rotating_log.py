@@ -0,0 +1,149 @@
+# -*- coding:utf-8 -*-
+"""
+执行日志 coupons.log 的写入与按大小轮转
+定时任务和 Web 进程都通过 RotatingLogWriter 追加写入，写入和轮转在文件锁内完成，
+超过大小阈值时当前文件压缩为 coupons.log.1.gz，旧的压缩文件依次后移，只保留指定份数
+"""
+import os
+import sys
+import gzip
+import atexit
+import shutil
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只保证单进程内的互斥
+    fcntl = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LOG_FILE = '/var/log/meituan/coupons.log' if os.path.exists('/var/log/meituan') else os.path.join(SCRIPT_DIR, 'coupons.log')
+LOG_FILE = os.environ.get('LOG_FILE', DEFAULT_LOG_FILE)
+# 单个日志文件的大小上限（字节）和保留的压缩份数
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', '5'))
+
+
+def rotated_path(path, generation):
+    return f'{path}.{generation}.gz'
+
+
+def read_generation(path, generation):
+    """读取第 generation 份轮转文件的内容，不存在时返回 None"""
+    gz_path = rotated_path(path, generation)
+    if os.path.exists(gz_path):
+        with gzip.open(gz_path, 'rb') as f:
+            return f.read()
+    # 轮转过程中文件可能还没压缩完
+    if generation == 1 and os.path.exists(f'{path}.1'):
+        with open(f'{path}.1', 'rb') as f:
+            return f.read()
+    return None
+
+
+class RotatingLogWriter:
+    def __init__(self, path=LOG_FILE, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f'{self.path}.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        if not data:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._locked():
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if size and self.max_bytes and size + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, 'ab') as f:
+                f.write(data)
+
+    def _rotate(self):
+        """在文件锁内调用：后移旧的压缩文件，当前文件改名后压缩"""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        oldest = rotated_path(self.path, self.backup_count)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for generation in range(self.backup_count - 1, 0, -1):
+            source = rotated_path(self.path, generation)
+            if os.path.exists(source):
+                os.replace(source, rotated_path(self.path, generation + 1))
+        # 先改名，新的写入会落到新文件，跟随读取的一方可以通过 inode 变化发现轮转
+        pending = f'{self.path}.1'
+        os.replace(self.path, pending)
+        with open(pending, 'rb') as src, gzip.open(f'{rotated_path(self.path, 1)}.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(f'{rotated_path(self.path, 1)}.tmp', rotated_path(self.path, 1))
+        os.remove(pending)
+
+
+class LogStream:
+    """替换 sys.stdout / sys.stderr，按行写入轮转日志，同时输出到原来的流"""
+
+    def __init__(self, writer, echo=None):
+        self.writer = writer
+        self.echo = echo
+        self._buffer = ''
+        # 多个线程可能同时 print
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        if self.echo:
+            self.echo.write(text)
+        with self._lock:
+            self._buffer += text
+            if '\n' not in self._buffer:
+                return len(text)
+            complete, _, self._buffer = self._buffer.rpartition('\n')
+            self.writer.write(complete + '\n')
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            if self._buffer:
+                self.writer.write(self._buffer)
+                self._buffer = ''
+        if self.echo:
+            self.echo.flush()
+
+    def isatty(self):
+        return False
+
+
+_writers = {}
+
+
+def get_log_writer(path=None):
+    """同一路径在进程内共用一个写入器"""
+    path = path or LOG_FILE
+    if path not in _writers:
+        _writers[path] = RotatingLogWriter(path)
+    return _writers[path]
+
+
+def redirect_output(path=None):
+    """将当前进程的标准输出和错误输出写入轮转日志"""
+    writer = get_log_writer(path)
+    sys.stdout = LogStream(writer, sys.stdout)
+    sys.stderr = LogStream(writer, sys.stderr)
+    atexit.register(sys.stdout.flush)
+    atexit.register(sys.stderr.flush)
+    return writer
@@ -0,0 +1,223 @@
+# -*- coding:utf-8 -*-
+"""
+常驻进程内的定时领取调度器，替代 crond
+执行时间读取 system_configs 中的 cron_hours（如 "8,14"、"9-18"、"*/2"），
+通过 /api/config 修改后立即生效；各次执行复用同一个 HTTP 连接池和数据库连接。
+启用 Web 控制台时运行在 Web 进程内，否则直接运行本脚本。
+
+用法: python scheduler.py
+"""
+import os
+import sys
+import time
+import sqlite3
+import threading
+import functools
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，不做多实例检查
+    fcntl = None
+
+from meituan import create_session, POOL_SIZE
+from storage import connect, get_data_dir, get_db_path
+from migrations import upgrade
+from rotating_log import get_log_writer, redirect_output, LogStream
+from cron_grab import run_grab, DEFAULT_CONCURRENCY, DEFAULT_BATCH_SIZE
+
+# Web 进程内是否启动调度器，由 entrypoint.sh 设置
+SCHEDULER_ENABLED = os.environ.get('ENABLE_SCHEDULER', 'false').lower() in ('true', '1')
+# 检查 cron_hours 变化的间隔（秒）
+SCHEDULER_POLL_INTERVAL = float(os.environ.get('SCHEDULER_POLL_INTERVAL', '30'))
+DEFAULT_CRON_HOURS = os.environ.get('CRON_HOURS', '8,14')
+RUN_ON_START = os.environ.get('RUN_ON_START', 'false').lower() in ('true', '1')
+
+
+def parse_hours(spec):
+    """解析 cron 小时字段，支持 "8,14"、"9-18"、"*/2"、"*"，格式错误时抛出 ValueError"""
+    hours = set()
+    for part in str(spec).replace(' ', '').split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+        if part == '*':
+            start, end = 0, 23
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = end = int(part)
+        if not (0 <= start <= end <= 23 and step > 0):
+            raise ValueError(f'无效的小时: {spec}')
+        hours.update(range(start, end + 1, step))
+    if not hours:
+        raise ValueError(f'无效的小时: {spec}')
+    return sorted(hours)
+
+
+def next_run_after(now, hours):
+    """now 之后最近的整点执行时间"""
+    base = now.replace(minute=0, second=0, microsecond=0)
+    for day in range(2):
+        for hour in hours:
+            candidate = base.replace(hour=hour) + timedelta(days=day)
+            if candidate > now:
+                return candidate
+    return None
+
+
+class GrabScheduler:
+    def __init__(self, db_path=None, concurrency=DEFAULT_CONCURRENCY, batch_size=DEFAULT_BATCH_SIZE,
+                 poll_interval=SCHEDULER_POLL_INTERVAL):
+        self.db_path = db_path
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.cron_hours = None
+        self.hours = None
+        self.next_run = None
+        self.last_run = None
+        self.running = False
+        self.run_count = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+        self.session = None
+        self.conn = None
+
+    def acquire_instance_lock(self):
+        """同一数据目录只允许一个调度器实例"""
+        if fcntl is None:
+            return True
+        self._lock_file = open(os.path.join(get_data_dir(), 'scheduler.lock'), 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def start(self):
+        if self._thread is not None:
+            return True
+        if not self.acquire_instance_lock():
+            print("调度器已在其他进程中运行")
+            return False
+        self._thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+        self._thread.start()
+        return True
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def reload(self):
+        """配置变化后立即重新读取执行时间"""
+        self._wakeup.set()
+
+    def get_conn(self):
+        """数据库由 Web 控制台创建，文件不存在时不连接，避免生成空的数据库文件"""
+        if self.conn is None and os.path.exists(self.db_path or get_db_path()):
+            upgrade(self.db_path)
+            self.conn = connect(self.db_path)
+        return self.conn
+
+    def read_cron_hours(self):
+        conn = self.get_conn()
+        if conn is None:
+            return DEFAULT_CRON_HOURS
+        try:
+            row = conn.execute("SELECT value FROM system_configs WHERE key = 'cron_hours'").fetchone()
+        except sqlite3.Error:
+            # 数据库还未由 Web 控制台初始化
+            row = None
+        return row[0] if row and row[0] else DEFAULT_CRON_HOURS
+
+    def refresh_schedule(self, now):
+        spec = self.read_cron_hours()
+        if spec != self.cron_hours:
+            try:
+                self.hours = parse_hours(spec)
+            except ValueError as e:
+                # 保留原来的执行时间
+                print(f"[错误] {e}")
+                self.cron_hours = spec
+                return
+            self.cron_hours = spec
+            self.next_run = next_run_after(now, self.hours)
+            print(f"定时执行时间: 每天 {spec} 点，下次执行: {self.next_run:%Y-%m-%d %H:%M}")
+
+    def run_once(self):
+        """执行一轮领取，输出写入执行日志，记录耗时"""
+        started = time.monotonic()
+        self.running = True
+        self.last_run = {'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        # 领取输出写入执行日志；只替换本次执行的输出函数，不影响同进程其他线程的 print
+        stream = LogStream(get_log_writer(), sys.stdout) if not isinstance(sys.stdout, LogStream) else None
+        log = functools.partial(print, file=stream) if stream else print
+        try:
+            accounts, success, limiter_wait_ms = run_grab(self.session, self.concurrency, self.batch_size,
+                                                          conn=self.get_conn(), log=log)
+            self.last_run.update({'status': 'completed', 'accounts': accounts, 'success': success, 'limiter_wait_ms': limiter_wait_ms})
+        except Exception as e:
+            self.last_run.update({'status': 'failed', 'error': str(e)})
+            print(f"[错误] 定时领取失败: {e}")
+        finally:
+            if stream:
+                stream.flush()
+            self.running = False
+            self.run_count += 1
+            self.last_run['finished_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.last_run['duration_ms'] = round((time.monotonic() - started) * 1000)
+
+    def run_forever(self):
+        # 连接池和数据库连接在各次执行之间保持
+        self.session = create_session(max(POOL_SIZE, self.concurrency))
+        try:
+            if RUN_ON_START:
+                self.run_once()
+            while not self._stop.is_set():
+                now = datetime.now()
+                try:
+                    self.refresh_schedule(now)
+                except Exception as e:
+                    # 数据库暂时不可用时保持原来的执行时间，下次检查时重试
+                    print(f"[错误] 读取执行时间失败: {e}")
+                if self.next_run and now >= self.next_run:
+                    self.run_once()
+                    self.next_run = next_run_after(datetime.now(), self.hours)
+                    continue
+                timeout = self.poll_interval
+                if self.next_run:
+                    timeout = min(timeout, max((self.next_run - now).total_seconds(), 0))
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+
+    def status(self):
+        return {
+            'cron_hours': self.cron_hours,
+            'next_run': self.next_run.strftime('%Y-%m-%d %H:%M:%S') if self.next_run else None,
+            'running': self.running,
+            'run_count': self.run_count,
+            'last_run': self.last_run
+        }
+
+
+scheduler = GrabScheduler()
+
+
+if __name__ == '__main__':
+    redirect_output()
+    if scheduler.acquire_instance_lock():
+        scheduler.run_forever()
+    else:
+        print("调度器已在其他进程中运行")
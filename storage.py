@@ -0,0 +1,101 @@
+# -*- coding:utf-8 -*-
+"""
+SQLite 存储层
+web.py 与 cron_grab.py 共用的数据库路径和连接参数：
+每个连接都启用 WAL、busy_timeout、mmap 和缓存设置，
+读写可以并发进行，定时任务写入时控制台不再出现 "database is locked"
+"""
+import os
+import zlib
+import sqlite3
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 等待写锁的最长时间（毫秒）
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+# 内存映射大小（字节），0 表示关闭
+MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))
+# 每个连接的页缓存大小（KB）
+CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '16384'))
+
+# 领取历史写入时同步累加 daily_grab_stats，Web 与定时任务共用
+UPSERT_DAILY_STATS_SQL = """
+    INSERT INTO daily_grab_stats (account_id, day, runs, success_count, failed_count, total_coupons)
+    VALUES (:account_id, :day, 1, :success_count, :failed_count, :total_coupons)
+    ON CONFLICT (account_id, day) DO UPDATE SET
+        runs = runs + 1,
+        success_count = success_count + excluded.success_count,
+        failed_count = failed_count + excluded.failed_count,
+        total_coupons = total_coupons + excluded.total_coupons
+"""
+
+PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('cache_size', -CACHE_SIZE_KB),
+    ('mmap_size', MMAP_SIZE),
+    ('temp_store', 'MEMORY'),
+]
+
+
+def compress_text(text):
+    """压缩文本用于 BLOB 存储"""
+    return zlib.compress((text or '').encode('utf-8'), 6)
+
+
+def decompress_text(data):
+    return zlib.decompress(data).decode('utf-8') if data else ''
+
+
+def get_data_dir():
+    """获取数据目录"""
+    default_data_dir = '/app/data' if os.path.exists('/app') else os.path.join(SCRIPT_DIR, 'data')
+    return os.environ.get('DATA_DIR', default_data_dir)
+
+
+def get_db_path():
+    """获取数据库路径"""
+    return os.environ.get('DB_PATH', f'{get_data_dir()}/meituan.db')
+
+
+def get_database_uri(db_path=None):
+    return f'sqlite:///{db_path or get_db_path()}'
+
+
+def apply_pragmas(conn, readonly=False):
+    """为 sqlite3 连接设置 PRAGMA，readonly 连接禁止写入"""
+    cursor = conn.cursor()
+    for name, value in PRAGMAS:
+        cursor.execute(f'PRAGMA {name}={value}')
+    if readonly:
+        cursor.execute('PRAGMA query_only=ON')
+    cursor.close()
+
+
+def connect(db_path=None, readonly=False):
+    """打开已设置好 PRAGMA 的 sqlite3 连接"""
+    conn = sqlite3.connect(db_path or get_db_path(), timeout=BUSY_TIMEOUT_MS / 1000)
+    apply_pragmas(conn, readonly)
+    return conn
+
+
+def install_pragmas(engine, readonly=False):
+    """让 SQLAlchemy engine 的每个新连接都应用 PRAGMA"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, connection_record):
+        apply_pragmas(dbapi_conn, readonly)
+
+    return engine
+
+
+def create_read_session(database_uri, scopefunc=None, query_cls=None):
+    """创建只读的 scoped session，读请求使用独立连接，不与写事务争用"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Query, scoped_session, sessionmaker
+
+    engine = install_pragmas(create_engine(database_uri), readonly=True)
+    factory = sessionmaker(bind=engine, autoflush=False, query_cls=query_cls or Query)
+    return scoped_session(factory, scopefunc=scopefunc)
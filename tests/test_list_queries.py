@@ -0,0 +1,88 @@
+# -*- coding:utf-8 -*-
+"""
+列表接口的查询次数回归测试
+历史、日志和控制台统计接口的 SQL 条数不能随数据行数增长（避免逐行懒加载的 N+1 查询）
+"""
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# 必须在导入 web 之前设置，使用临时数据目录
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='test-list-queries-')
+os.environ['RETENTION_INTERVAL_HOURS'] = '0'
+
+import pytest
+from sqlalchemy import event
+
+import web
+from cache import response_cache
+from models import db, User, MeituanAccount, GrabHistory, SystemLog
+
+USER_COUNT = 3
+ENDPOINTS = ['/api/history', '/api/history?cursor=', '/api/logs', '/api/logs?cursor=', '/api/dashboard/stats']
+
+
+def seed(rows):
+    """新增 rows 条领取历史和系统日志，分属多个用户和账号"""
+    with web.app.app_context():
+        users = User.query.filter(User.username.like('user%')).all()
+        if not users:
+            for i in range(USER_COUNT):
+                user = User(username=f'user{i}')
+                user.set_password('password')
+                db.session.add(user)
+                db.session.flush()
+                users.append(user)
+                for j in range(2):
+                    db.session.add(MeituanAccount(user_id=user.id, name=f'user{i}-acc{j}', token=f'token-{i}-{j}'))
+            db.session.commit()
+        accounts = MeituanAccount.query.all()
+        for i in range(rows):
+            db.session.add(GrabHistory(account_id=accounts[i % len(accounts)].id, status='success',
+                                       total_coupons=1, success_count=1, failed_count=0, details='[]'))
+            db.session.add(SystemLog(level='INFO', category='grab', message=f'log {i}', user_id=users[i % len(users)].id))
+        db.session.commit()
+
+
+def login(username, password):
+    client = web.app.test_client()
+    response = client.post('/api/auth/login', json={'username': username, 'password': password})
+    assert response.status_code == 200
+    return client
+
+
+def count_queries(client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = web.read_db.session_factory.kw['bind']
+    # 每次都从数据库读取，不命中响应缓存
+    response_cache.invalidate()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, url
+    return len(statements)
+
+
+@pytest.fixture(scope='module')
+def clients():
+    seed(5)
+    return {'admin': login('admin', 'admin123'), 'user': login('user0', 'password')}
+
+
+@pytest.mark.parametrize('role', ['admin', 'user'])
+@pytest.mark.parametrize('url', ENDPOINTS)
+def test_query_count_independent_of_rows(clients, role, url):
+    client = clients[role]
+    before = count_queries(client, url)
+    seed(60)
+    after = count_queries(client, url)
+    assert after == before, f'{url} ({role}): {before} -> {after} 条查询'
@@ -1,40 +1,98 @@
 import os
 import re
 import json
-import subprocess
-from datetime import datetime
+import time
+import uuid
+import queue
+import base64
+import threading
+import hashlib
+from datetime import datetime, timedelta
 from functools import wraps
 
-from flask import Flask, request, jsonify, session, redirect, url_for, render_template_string
-from models import db, init_db, User, MeituanAccount, GrabHistory, SystemLog, SystemConfig
+from flask import Flask, Response, g, request, jsonify, session, redirect, url_for
+from flask.globals import app_ctx
+from flask_sqlalchemy.query import Query
+from models import db, init_db, User, MeituanAccount, GrabHistory, GrabJob, DailyGrabStat, SystemLog, SystemConfig
+from grab_jobs import submit_job, recover_interrupted_jobs
+from cache import response_cache
+from log_sink import log_sink
+from ratelimit import rate_limiter
+from log_tail import tail_lines, follow, FOLLOW_HEARTBEAT
+from events import broadcaster
+from compression import init_compression, matching_etag, StaticAsset
+from rotating_log import LOG_FILE
+from scheduler import scheduler, parse_hours, SCHEDULER_ENABLED
+from retention import (start_archiver, start_vacuum, incremental_vacuum_enabled, list_archives, read_archive, last_result as retention_result,
+                       vacuum_state, VACUUM_MIN_IDLE_MINUTES)
+from storage import get_data_dir, get_db_path, get_database_uri, create_read_session
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'meituan-coupons-secret-key-2024')
+init_compression(app)
 
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-DEFAULT_DATA_DIR = '/app/data' if os.path.exists('/app') else os.path.join(SCRIPT_DIR, 'data')
-DATA_DIR = os.environ.get('DATA_DIR', DEFAULT_DATA_DIR)
+DATA_DIR = get_data_dir()
 os.makedirs(DATA_DIR, exist_ok=True)
-DB_PATH = os.environ.get('DB_PATH', f'{DATA_DIR}/meituan.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_PATH}'
+DB_PATH = get_db_path()
+app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri(DB_PATH)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-DEFAULT_LOG_FILE = '/var/log/meituan/coupons.log' if os.path.exists('/var/log/meituan') else os.path.join(SCRIPT_DIR, 'coupons.log')
-LOG_FILE = os.environ.get('LOG_FILE', DEFAULT_LOG_FILE)
+# GET 接口使用独立的只读连接，不会等待领取任务的写事务
+read_db = create_read_session(app.config['SQLALCHEMY_DATABASE_URI'], scopefunc=lambda: id(app_ctx._get_current_object()), query_cls=Query)
+
+
+@app.teardown_appcontext
+def remove_read_session(exc):
+    read_db.remove()
+
+# 单个日志和事件推送连接的最长时间（秒），到期后浏览器会自动重连
+LOG_STREAM_TIMEOUT = int(os.environ.get('LOG_STREAM_TIMEOUT', '300'))
+# 每个推送连接占用一个工作线程直到断开，总数不超过线程数的一半，其余线程留给普通请求
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '8'))
+MAX_STREAMS = int(os.environ.get('MAX_STREAMS', str(max(WEB_THREADS // 2, 1))))
+# 同一浏览器会话的推送连接数，浏览器对同一站点最多只有 6 个 HTTP/1.1 连接
+MAX_STREAMS_PER_SESSION = 2
+
+open_streams = {}
+open_streams_lock = threading.Lock()
+
+
+def acquire_stream():
+    """占用一个推送连接名额，已满时返回 None，成功时返回释放函数"""
+    stream_id = session.setdefault('stream_id', uuid.uuid4().hex)
+    with open_streams_lock:
+        if sum(open_streams.values()) >= MAX_STREAMS or open_streams.get(stream_id, 0) >= MAX_STREAMS_PER_SESSION:
+            return None
+        open_streams[stream_id] = open_streams.get(stream_id, 0) + 1
+
+    def release():
+        with open_streams_lock:
+            open_streams[stream_id] -= 1
+            if not open_streams[stream_id]:
+                del open_streams[stream_id]
+    return release
+
+
+def stream_response(chunks, release):
+    # 连接关闭时释放名额，生成器未开始执行也会调用
+    response = Response(chunks, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release)
+    return response
+
+
+def streams_full():
+    # 浏览器收到非 200 响应后不再自动重连，由页面改为定时刷新
+    return jsonify({"success": False, "message": "实时推送连接已满，请使用定时刷新"}), 503, {'Retry-After': '30'}
 
 
 def log_action(level: str, category: str, message: str, details: str = None):
+    """日志交给后台线程批量写入，不在请求内提交"""
     try:
-        log = SystemLog(
-            level=level,
-            category=category,
-            message=message,
-            details=details,
+        log_sink.put(
+            level, category, message, details,
             ip_address=request.remote_addr if request else None,
             user_id=session.get('user_id')
         )
-        db.session.add(log)
-        db.session.commit()
     except Exception as e:
         print(f"Log error: {e}")
 
@@ -59,6 +117,104 @@ def admin_required(f):
     return decorated_function
 
 
+def response_scope():
+    """响应内容的可见范围，管理员共用一份"""
+    return 'admin' if session.get('is_admin') else f"user:{session.get('user_id')}"
+
+
+def get_table_versions(tables):
+    rows = read_db.execute(
+        db.text('SELECT name, version FROM table_versions WHERE name IN :names').bindparams(db.bindparam('names', expanding=True)),
+        {'names': list(tables)}
+    ).all()
+    return tuple(sorted(rows))
+
+
+def etag_response(*tables):
+    """根据相关表的版本号生成强 ETag，If-None-Match 命中时不执行查询直接返回 304"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # 日期也参与计算，"今日" 统计跨天时会变化
+            source = f"{request.path}|{response_scope()}|{request.query_string.decode()}|{get_table_versions(tables)}|{datetime.now().date()}"
+            g.etag = hashlib.sha1(source.encode()).hexdigest()[:20]
+            # 压缩后的响应由 compress_response 加上编码后缀，任一编码的 ETag 都算命中
+            etag = matching_etag(g.etag)
+            if etag:
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(f(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag or g.etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+
+def cached_response(name):
+    """缓存 GET 接口的 JSON 响应，按用户（管理员共用一份）、查询参数和 ETag 区分"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # ETag 随表版本号变化，定时任务写入后旧的缓存不会再被命中
+            key = (name, response_scope(), request.query_string, g.get('etag'))
+            cached = response_cache.get(key)
+            if cached is not None:
+                return app.response_class(cached, mimetype='application/json')
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response_cache.set(key, response.get_data())
+            return response
+        return decorated_function
+    return decorator
+
+
+MAX_PER_PAGE = 100
+
+
+def get_per_page(default):
+    """每页条数限制在 1 到 MAX_PER_PAGE 之间"""
+    return max(1, min(request.args.get('per_page', default, type=int), MAX_PER_PAGE))
+
+
+def encode_cursor(sort_value, row_id) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_paginate(query, sort_column, id_column, cursor, per_page, with_total=False):
+    """按 (时间, id) 倒序的游标分页，不使用 OFFSET，默认不统计总数"""
+    # 以数据库中的原始文本比较，避免时间格式不一致导致漏行或重复
+    sort_key = db.type_coerce(sort_column, db.String)
+    per_page = max(1, per_page)
+    total = query.order_by(None).count() if with_total else None
+    query = query.add_columns(sort_key.label('cursor_key'))
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return None
+        query = query.filter(db.tuple_(sort_key, id_column) < db.tuple_(db.literal(position[0]), db.literal(position[1])))
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    pagination = {
+        "per_page": per_page,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(rows[-1].cursor_key, rows[-1].id) if has_more and rows else None
+    }
+    if with_total:
+        pagination["total"] = total
+    return rows, pagination
+
+
 def get_user_account_ids():
     if session.get('is_admin'):
         return None
@@ -78,23 +234,6 @@ def extract_token(input_str: str) -> str:
     return None
 
 
-def parse_grab_output(output: str) -> dict:
-    result = {'total': 0, 'success': 0, 'failed': 0, 'coupons': []}
-    for line in output.split('\n'):
-        line = line.strip()
-        if not line:
-            continue
-        # 先检查失败，因为"领取失败"同时包含"领取"和"失败"
-        if '失败' in line or '错误' in line or '异常' in line:
-            result['failed'] += 1
-            result['coupons'].append({'name': line, 'status': 'failed'})
-        elif '成功领取' in line:
-            result['success'] += 1
-            result['coupons'].append({'name': line, 'status': 'success'})
-    result['total'] = result['success'] + result['failed']
-    return result
-
-
 @app.route('/')
 def index():
     if session.get('logged_in'):
@@ -106,13 +245,21 @@ def index():
 def login_page():
     if session.get('logged_in'):
         return redirect(url_for('dashboard'))
-    return render_template_string(LOGIN_TEMPLATE)
+    return LOGIN_PAGE.response(app.response_class)
 
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template_string(DASHBOARD_TEMPLATE)
+    return DASHBOARD_PAGE.response(app.response_class)
+
+
+@app.route('/assets/<filename>')
+def static_asset(filename):
+    asset = ASSETS.get(filename)
+    if asset is None:
+        return jsonify({"success": False, "message": "资源不存在"}), 404
+    return asset.response(app.response_class)
 
 
 @app.route('/api/auth/login', methods=['POST'])
@@ -193,54 +340,65 @@ def api_change_password():
 @app.route('/api/auth/me')
 @login_required
 def api_me():
-    user = User.query.get(session['user_id'])
+    user = read_db.get(User, session['user_id'])
     return jsonify({"success": True, "data": user.to_dict()})
 
 
 @app.route('/api/dashboard/stats')
 @login_required
+@etag_response('meituan_accounts', 'daily_grab_stats', 'grab_histories', 'system_configs')
+@cached_response('dashboard')
 def api_dashboard_stats():
     user_id = session['user_id']
     is_admin = session.get('is_admin')
 
     if is_admin:
-        accounts_query = MeituanAccount.query
-        history_query = GrabHistory.query
+        accounts_query = read_db.query(MeituanAccount)
+        history_query = GrabHistory.list_query(read_db)
+        stats_query = read_db.query(DailyGrabStat)
     else:
-        accounts_query = MeituanAccount.query.filter_by(user_id=user_id)
-        account_ids = [a.id for a in accounts_query.all()]
-        history_query = GrabHistory.query.filter(GrabHistory.account_id.in_(account_ids)) if account_ids else GrabHistory.query.filter(False)
+        accounts_query = read_db.query(MeituanAccount).filter_by(user_id=user_id)
+        account_ids = [account_id for account_id, in accounts_query.with_entities(MeituanAccount.id)]
+        history_query = GrabHistory.list_query(read_db).filter(MeituanAccount.user_id == user_id)
+        stats_query = read_db.query(DailyGrabStat).filter(DailyGrabStat.account_id.in_(account_ids)) if account_ids else read_db.query(DailyGrabStat).filter(False)
 
     total_accounts = accounts_query.count()
     active_accounts = accounts_query.filter_by(is_active=True).count()
 
+    # 统计数据来自按日汇总表，不随历史记录数量增长
     today = datetime.now().date()
-    today_grabs = history_query.filter(db.func.date(GrabHistory.grab_time) == today).all()
-    today_success = sum(h.success_count for h in today_grabs)
-    today_failed = sum(h.failed_count for h in today_grabs)
+    today_total, today_success, today_failed = stats_query.filter(DailyGrabStat.day == today).with_entities(
+        db.func.coalesce(db.func.sum(DailyGrabStat.runs), 0),
+        db.func.coalesce(db.func.sum(DailyGrabStat.success_count), 0),
+        db.func.coalesce(db.func.sum(DailyGrabStat.failed_count), 0)
+    ).one()
+    total_grabs = stats_query.with_entities(db.func.coalesce(db.func.sum(DailyGrabStat.runs), 0)).scalar()
 
     recent_grabs = history_query.order_by(GrabHistory.grab_time.desc()).limit(5).all()
-    cron_hours = SystemConfig.get('cron_hours', '8,14')
+    cron_config = read_db.query(SystemConfig).filter_by(key='cron_hours').first()
+    cron_hours = cron_config.value if cron_config else '8,14'
 
     return jsonify({
         "success": True,
         "data": {
             "accounts": {"total": total_accounts, "active": active_accounts},
-            "today": {"total": len(today_grabs), "success": today_success, "failed": today_failed},
-            "total_grabs": history_query.count(),
+            "today": {"date": today.isoformat(), "total": today_total, "success": today_success, "failed": today_failed},
+            "total_grabs": total_grabs,
             "cron_hours": cron_hours,
-            "recent_grabs": [g.to_dict() for g in recent_grabs]
+            "recent_grabs": [GrabHistory.row_to_dict(row) for row in recent_grabs]
         }
     })
 
 
 @app.route('/api/accounts', methods=['GET'])
 @login_required
+@etag_response('meituan_accounts')
+@cached_response('accounts')
 def api_get_accounts():
     if session.get('is_admin'):
-        accounts = MeituanAccount.query.order_by(MeituanAccount.created_at.desc()).all()
+        accounts = read_db.query(MeituanAccount).order_by(MeituanAccount.created_at.desc()).all()
     else:
-        accounts = MeituanAccount.query.filter_by(user_id=session['user_id']).order_by(MeituanAccount.created_at.desc()).all()
+        accounts = read_db.query(MeituanAccount).filter_by(user_id=session['user_id']).order_by(MeituanAccount.created_at.desc()).all()
     return jsonify({"success": True, "data": [a.to_dict() for a in accounts]})
 
 
@@ -265,6 +423,7 @@ def api_add_account():
     account = MeituanAccount(name=name, token=token, user_id=session['user_id'])
     db.session.add(account)
     db.session.commit()
+    response_cache.invalidate('accounts', 'dashboard')
 
     log_action('INFO', 'account', f'添加账号: {name}')
     return jsonify({"success": True, "message": "添加成功", "data": account.to_dict()})
@@ -289,6 +448,7 @@ def api_update_account(account_id):
         account.is_active = data['is_active']
 
     db.session.commit()
+    response_cache.invalidate('accounts', 'dashboard')
     log_action('INFO', 'account', f'更新账号: {account.name}')
     return jsonify({"success": True, "message": "更新成功", "data": account.to_dict()})
 
@@ -304,6 +464,7 @@ def api_delete_account(account_id):
     name = account.name
     db.session.delete(account)
     db.session.commit()
+    response_cache.invalidate('accounts', 'dashboard')
     log_action('INFO', 'account', f'删除账号: {name}')
     return jsonify({"success": True, "message": "删除成功"})
 
@@ -327,93 +488,92 @@ def api_run_grab():
     if not accounts:
         return jsonify({"success": False, "message": "没有可执行的账号"}), 400
 
-    results = []
-    for account in accounts:
-        account.last_run_at = datetime.now()
-        account.last_run_status = 'running'
-        db.session.commit()
+    job = submit_job(app, session['user_id'], accounts)
+    log_action('INFO', 'grab', f'提交领取任务 {job.id}，账号数: {len(accounts)}')
+    return jsonify({"success": True, "message": "任务已提交", "job_id": job.id, "data": job.to_dict()}), 202
 
-        try:
-            env = os.environ.copy()
-            env['MEITUAN_TOKEN'] = account.token
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            script_path = os.path.join(script_dir, 'meituan.py')
-            result = subprocess.run(['python', script_path], capture_output=True, text=True, timeout=120, env=env)
-            output = result.stdout + result.stderr
-            parsed = parse_grab_output(output)
-
-            history = GrabHistory(
-                account_id=account.id,
-                status='success' if parsed['success'] > 0 else 'failed',
-                total_coupons=parsed['total'],
-                success_count=parsed['success'],
-                failed_count=parsed['failed'],
-                details=json.dumps(parsed['coupons'], ensure_ascii=False),
-                raw_output=output
-            )
-            db.session.add(history)
-            account.last_run_status = 'success' if parsed['success'] > 0 else 'failed'
-            results.append({'account': account.name, 'status': account.last_run_status, 'success': parsed['success'], 'failed': parsed['failed']})
-
-        except subprocess.TimeoutExpired:
-            account.last_run_status = 'timeout'
-            results.append({'account': account.name, 'status': 'timeout', 'error': '执行超时'})
-        except Exception as e:
-            account.last_run_status = 'failed'
-            results.append({'account': account.name, 'status': 'failed', 'error': str(e)})
-
-        db.session.commit()
 
-    log_action('INFO', 'grab', f'执行领取，账号数: {len(accounts)}')
-    return jsonify({"success": True, "message": "执行完成", "results": results})
+@app.route('/api/grab/jobs/<job_id>')
+@login_required
+def api_get_grab_job(job_id):
+    if session.get('is_admin'):
+        job = read_db.query(GrabJob).get_or_404(job_id)
+    else:
+        job = read_db.query(GrabJob).filter_by(id=job_id, user_id=session['user_id']).first_or_404()
+    return jsonify({"success": True, "data": job.to_dict(include_results=True)})
 
 
 @app.route('/api/history')
 @login_required
+@etag_response('grab_histories', 'meituan_accounts')
 def api_get_history():
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    per_page = get_per_page(20)
     account_id = request.args.get('account_id', type=int)
 
-    if session.get('is_admin'):
-        query = GrabHistory.query
-    else:
-        account_ids = [a.id for a in MeituanAccount.query.filter_by(user_id=session['user_id']).all()]
-        query = GrabHistory.query.filter(GrabHistory.account_id.in_(account_ids)) if account_ids else GrabHistory.query.filter(False)
+    query = GrabHistory.list_query(read_db)
+    if not session.get('is_admin'):
+        query = query.filter(MeituanAccount.user_id == session['user_id'])
 
     if account_id:
-        query = query.filter_by(account_id=account_id)
+        query = query.filter(GrabHistory.account_id == account_id)
+
+    # 传入 cursor 参数（首页为空字符串）时使用游标分页
+    if 'cursor' in request.args:
+        page_result = keyset_paginate(query, GrabHistory.grab_time, GrabHistory.id, request.args['cursor'], per_page,
+                                      with_total=request.args.get('with_total', type=int) == 1)
+        if page_result is None:
+            return jsonify({"success": False, "message": "无效的游标"}), 400
+        rows, pagination = page_result
+        return jsonify({"success": True, "data": [GrabHistory.row_to_dict(row) for row in rows], "pagination": pagination})
 
     pagination = query.order_by(GrabHistory.grab_time.desc()).paginate(page=page, per_page=per_page, error_out=False)
     return jsonify({
         "success": True,
-        "data": [h.to_dict() for h in pagination.items],
+        "data": [GrabHistory.row_to_dict(row) for row in pagination.items],
         "pagination": {"page": page, "per_page": per_page, "total": pagination.total, "pages": pagination.pages}
     })
 
 
+@app.route('/api/history/<int:history_id>/raw')
+@login_required
+def api_get_history_raw(history_id):
+    history = read_db.get(GrabHistory, history_id)
+    if history is None or (not session.get('is_admin') and (history.account is None or history.account.user_id != session['user_id'])):
+        return jsonify({"success": False, "message": "记录不存在"}), 404
+    return jsonify({"success": True, "data": history.get_raw_output()})
+
+
 @app.route('/api/logs')
 @login_required
 def api_get_logs():
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
+    per_page = get_per_page(50)
     level = request.args.get('level', '')
     category = request.args.get('category', '')
 
-    if session.get('is_admin'):
-        query = SystemLog.query
-    else:
-        query = SystemLog.query.filter_by(user_id=session['user_id'])
+    query = SystemLog.list_query(read_db)
+    if not session.get('is_admin'):
+        query = query.filter(SystemLog.user_id == session['user_id'])
 
     if level:
-        query = query.filter_by(level=level)
+        query = query.filter(SystemLog.level == level)
     if category:
-        query = query.filter_by(category=category)
+        query = query.filter(SystemLog.category == category)
+
+    # 传入 cursor 参数（首页为空字符串）时使用游标分页
+    if 'cursor' in request.args:
+        page_result = keyset_paginate(query, SystemLog.created_at, SystemLog.id, request.args['cursor'], per_page,
+                                      with_total=request.args.get('with_total', type=int) == 1)
+        if page_result is None:
+            return jsonify({"success": False, "message": "无效的游标"}), 400
+        rows, pagination = page_result
+        return jsonify({"success": True, "data": [SystemLog.row_to_dict(row) for row in rows], "pagination": pagination})
 
     pagination = query.order_by(SystemLog.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
     return jsonify({
         "success": True,
-        "data": [l.to_dict() for l in pagination.items],
+        "data": [SystemLog.row_to_dict(row) for row in pagination.items],
         "pagination": {"page": page, "per_page": per_page, "total": pagination.total, "pages": pagination.pages}
     })
 
@@ -421,23 +581,76 @@ def api_get_logs():
 @app.route('/api/logs/file')
 @login_required
 def api_get_log_file():
-    lines = request.args.get('lines', 200, type=int)
+    lines = min(request.args.get('lines', 200, type=int), 5000)
     try:
         if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r', encoding='utf-8', errors='ignore') as f:
-                all_lines = f.readlines()
-                content = ''.join(all_lines[-lines:])
+            content, offset = tail_lines(LOG_FILE, lines)
         else:
-            content = '暂无日志'
-        return jsonify({"success": True, "data": content})
+            content, offset = '暂无日志', 0
+        return jsonify({"success": True, "data": content, "offset": offset})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+@app.route('/api/logs/file/stream')
+@login_required
+def api_stream_log_file():
+    """SSE 推送执行日志新增的行，事件 id 为字节偏移，重连时从 Last-Event-ID 继续"""
+    offset = request.headers.get('Last-Event-ID') or request.args.get('offset')
+    offset = int(offset) if offset and offset.isdigit() else None
+    release = acquire_stream()
+    if release is None:
+        return streams_full()
+
+    def generate():
+        yield 'retry: 3000\n\n'
+        for text, position in follow(LOG_FILE, offset, timeout=LOG_STREAM_TIMEOUT):
+            if text is None:
+                yield ': ping\n\n'
+            else:
+                yield f'id: {position}\n' + ''.join(f'data: {line}\n' for line in text.splitlines()) + '\n'
+
+    return stream_response(generate(), release)
+
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    """SSE 推送新的领取历史、系统日志和账号执行状态"""
+    release_stream = acquire_stream()
+    if release_stream is None:
+        return streams_full()
+    # 浏览器自动重连时带上最后收到的事件 id，补发断开期间的事件
+    subscriber = broadcaster.subscribe(session['user_id'], session.get('is_admin'),
+                                       request.headers.get('Last-Event-ID'))
+
+    def release():
+        broadcaster.unsubscribe(subscriber)
+        release_stream()
+
+    def generate():
+        try:
+            # 没有补发的事件时先告诉浏览器当前位置，之后重连从这里继续
+            yield f'retry: 3000\nid: {subscriber.start_id}\n\n' if subscriber.start_id else 'retry: 3000\n\n'
+            deadline = time.monotonic() + LOG_STREAM_TIMEOUT
+            while time.monotonic() < deadline:
+                try:
+                    event, data, event_id = subscriber.get(timeout=FOLLOW_HEARTBEAT)
+                    yield f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+                except queue.Empty:
+                    yield ': ping\n\n'
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return stream_response(generate(), release)
+
+
 @app.route('/api/config')
 @login_required
+@etag_response('system_configs')
+@cached_response('config')
 def api_get_config():
-    configs = SystemConfig.query.all()
+    configs = read_db.query(SystemConfig).all()
     return jsonify({"success": True, "data": {c.key: {'value': c.value, 'description': c.description} for c in configs}})
 
 
@@ -446,20 +659,108 @@ def api_get_config():
 @admin_required
 def api_update_config():
     data = request.get_json() or {}
+    if 'cron_hours' in data:
+        try:
+            parse_hours(data['cron_hours'])
+        except ValueError:
+            return jsonify({"success": False, "message": "执行时间格式错误"}), 400
     for key, value in data.items():
         SystemConfig.set(key, str(value))
     log_action('INFO', 'system', '更新系统配置')
+    # 调度器立即读取新的执行时间
+    scheduler.reload()
     return jsonify({"success": True, "message": "配置已更新"})
 
 
+@app.route('/api/scheduler')
+@login_required
+def api_get_scheduler():
+    if not scheduler.is_alive():
+        return jsonify({"success": True, "data": {"enabled": False}})
+    return jsonify({"success": True, "data": dict(scheduler.status(), enabled=True)})
+
+
 @app.route('/api/admin/users')
 @login_required
 @admin_required
 def api_get_users():
-    users = User.query.order_by(User.created_at.desc()).all()
+    users = read_db.query(User).order_by(User.created_at.desc()).all()
     return jsonify({"success": True, "data": [u.to_dict() for u in users]})
 
 
+@app.route('/api/admin/cache')
+@login_required
+@admin_required
+def api_get_cache_stats():
+    return jsonify({"success": True, "data": response_cache.stats()})
+
+
+@app.route('/api/admin/log-sink')
+@login_required
+@admin_required
+def api_get_log_sink_stats():
+    return jsonify({"success": True, "data": log_sink.stats()})
+
+
+@app.route('/api/admin/rate-limiter')
+@login_required
+@admin_required
+def api_get_rate_limiter_stats():
+    return jsonify({"success": True, "data": rate_limiter.stats()})
+
+
+@app.route('/api/admin/archives')
+@login_required
+@admin_required
+def api_get_archives():
+    return jsonify({
+        "success": True,
+        "data": list_archives(),
+        "last_run": retention_result or None,
+        "incremental_vacuum": incremental_vacuum_enabled(DB_PATH),
+        "vacuum": vacuum_state or None
+    })
+
+
+@app.route('/api/admin/vacuum', methods=['POST'])
+@login_required
+@admin_required
+def api_start_vacuum():
+    """一次性 VACUUM 重建期间其他写入会在忙等超时后失败，只在没有领取任务时执行"""
+    next_run = scheduler.next_run if scheduler.is_alive() else None
+    jobs_running = read_db.query(GrabJob).filter(GrabJob.status.in_(['pending', 'running'])).count()
+    if scheduler.running or jobs_running or (next_run and next_run - datetime.now() < timedelta(minutes=VACUUM_MIN_IDLE_MINUTES)):
+        return jsonify({"success": False, "message": f"领取任务正在执行或将在 {VACUUM_MIN_IDLE_MINUTES} 分钟内执行，请稍后再试"}), 409
+    if not start_vacuum(DB_PATH):
+        return jsonify({"success": False, "message": "VACUUM 正在执行"}), 409
+    log_action('INFO', 'system', '开始执行 VACUUM 重建数据库')
+    return jsonify({"success": True, "message": "已开始执行 VACUUM，可在归档列表接口查看进度"}), 202
+
+
+@app.route('/api/admin/archives/<table>/<month>')
+@login_required
+@admin_required
+def api_get_archive(table, month):
+    page = request.args.get('page', 1, type=int)
+    per_page = get_per_page(20)
+    filters = {key: request.args.get(key) for key in ('account_id', 'status', 'level', 'category', 'user_id')}
+
+    rows = read_archive(table, month, filters=filters, keyword=request.args.get('keyword'))
+    if rows is None:
+        return jsonify({"success": False, "message": "归档不存在"}), 404
+
+    return jsonify({
+        "success": True,
+        "data": rows[(page - 1) * per_page:page * per_page],
+        "pagination": {
+            "page": page,
+            "per_page": per_page,
+            "total": len(rows),
+            "pages": (len(rows) + per_page - 1) // per_page
+        }
+    })
+
+
 @app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
 @login_required
 @admin_required
@@ -470,6 +771,7 @@ def api_delete_user(user_id):
     MeituanAccount.query.filter_by(user_id=user_id).delete()
     db.session.delete(user)
     db.session.commit()
+    response_cache.invalidate('accounts', 'dashboard')
     log_action('INFO', 'admin', f'删除用户: {user.username}')
     return jsonify({"success": True, "message": "删除成功"})
 
@@ -715,7 +1017,8 @@ DASHBOARD_TEMPLATE = '''
                             <div>
                                 <label class="block text-sm text-slate-600 mb-1">执行时间（小时）</label>
                                 <input type="text" id="config-cron-hours" class="w-full px-3 py-1.5 border border-slate-300 rounded text-sm" placeholder="8,14">
-                                <p class="text-xs text-slate-400 mt-1">多个小时用逗号分隔</p>
+                                <p class="text-xs text-slate-400 mt-1">多个小时用逗号分隔，也支持 9-18、*/2</p>
+                                <p id="scheduler-next" class="text-xs text-slate-400 mt-1"></p>
                             </div>
                             <button onclick="saveConfig()" id="save-config-btn" class="bg-slate-800 text-white px-4 py-1.5 rounded text-sm hover:bg-slate-700">保存</button>
                             <p id="admin-only-hint" class="text-xs text-slate-400 hidden">仅管理员可修改</p>
@@ -819,12 +1122,20 @@ DASHBOARD_TEMPLATE = '''
             setTimeout(()=>{t.classList.add('translate-x-full');setTimeout(()=>t.classList.add('hidden'),300);},3000);
         }
 
+        // GET 请求带上 If-None-Match，304 时复用上次的响应
+        const etagCache=new Map();
+
         async function api(url, opts={}) {
             try {
                 if(opts.method==='POST'&&!opts.body)opts.body='{}';
-                const r=await fetch(url,{headers:{'Content-Type':'application/json',...opts.headers},...opts});
+                const isGet=!opts.method||opts.method==='GET',cached=isGet?etagCache.get(url):null;
+                const headers={'Content-Type':'application/json',...(cached?{'If-None-Match':cached.etag}:{}),...opts.headers};
+                const r=await fetch(url,{cache:'no-store',...opts,headers});
+                if(r.status===304&&cached)return cached.data;
                 const d=await r.json();
                 if(r.status===401){window.location.href='/login';return null;}
+                const etag=r.headers.get('ETag');
+                if(isGet&&etag&&r.ok)etagCache.set(url,{etag,data:d});
                 return d;
             } catch(e) {showToast('网络错误','error');return null;}
         }
@@ -835,6 +1146,7 @@ DASHBOARD_TEMPLATE = '''
             document.getElementById('tab-'+name).classList.add('active');
             const item=document.querySelector(`[data-tab="${name}"]`);
             if(item)item.classList.add('active');
+            if(name!=='logs')stopLogStream();
             if(name==='dashboard')loadDashboard();
             else if(name==='accounts')loadAccounts();
             else if(name==='history')loadHistory();
@@ -867,19 +1179,24 @@ DASHBOARD_TEMPLATE = '''
             document.getElementById('stat-today').textContent=s.today.success;
             document.getElementById('stat-total').textContent=s.total_grabs;
             document.getElementById('stat-cron').textContent=s.cron_hours+' 点';
+            dashboardToday=s.today.date;
             const c=document.getElementById('recent-grabs');
             if(s.recent_grabs.length===0){c.innerHTML='<p class="text-slate-400 text-center py-6 text-sm">暂无记录</p>';}
-            else{c.innerHTML=s.recent_grabs.map(g=>`<div class="flex items-center justify-between p-3 bg-slate-50 rounded"><div><p class="font-medium text-slate-800 text-sm">${g.account_name}</p><p class="text-xs text-slate-500">${g.grab_time}</p></div><div class="text-right text-sm"><span class="status-${g.status}">${g.status==='success'?'成功':'失败'}</span><p class="text-xs text-slate-500">${g.success_count}/${g.failed_count}</p></div></div>`).join('');}
+            else{c.innerHTML=s.recent_grabs.map(recentGrabItem).join('');}
         }
 
+        function recentGrabItem(g){return `<div class="flex items-center justify-between p-3 bg-slate-50 rounded"><div><p class="font-medium text-slate-800 text-sm">${g.account_name}</p><p class="text-xs text-slate-500">${g.grab_time}</p></div><div class="text-right text-sm"><span class="status-${g.status}">${g.status==='success'?'成功':'失败'}</span><p class="text-xs text-slate-500">${g.success_count}/${g.failed_count}</p></div></div>`;}
+
         async function loadAccounts() {
             const d=await api('/api/accounts');
             if(!d||!d.success)return;
             const t=document.getElementById('accounts-table');
             if(d.data.length===0){t.innerHTML='<tr><td colspan="5" class="px-6 py-8 text-center text-slate-400">暂无账号</td></tr>';}
-            else{t.innerHTML=d.data.map(a=>`<tr class="border-b border-slate-100"><td class="px-6 py-4 font-medium text-slate-800">${a.name}</td><td class="px-6 py-4"><code class="text-sm text-slate-500">${a.token}</code></td><td class="px-6 py-4"><span class="px-2 py-1 rounded text-xs ${a.is_active?'bg-green-100 text-green-700':'bg-slate-100 text-slate-500'}">${a.is_active?'启用':'禁用'}</span></td><td class="px-6 py-4 text-sm text-slate-500">${a.last_run_at||'从未执行'}${a.last_run_status?` <span class="status-${a.last_run_status}">${a.last_run_status}</span>`:''}</td><td class="px-6 py-4"><button onclick="toggleAccount(${a.id},${!a.is_active})" class="text-slate-600 hover:text-slate-800 mr-3">${a.is_active?'禁用':'启用'}</button><button onclick="deleteAccount(${a.id},'${a.name}')" class="text-red-500 hover:text-red-700">删除</button></td></tr>`).join('');}
+            else{t.innerHTML=d.data.map(a=>`<tr class="border-b border-slate-100"><td class="px-6 py-4 font-medium text-slate-800">${a.name}</td><td class="px-6 py-4"><code class="text-sm text-slate-500">${a.token}</code></td><td class="px-6 py-4"><span class="px-2 py-1 rounded text-xs ${a.is_active?'bg-green-100 text-green-700':'bg-slate-100 text-slate-500'}">${a.is_active?'启用':'禁用'}</span></td><td id="account-run-${a.id}" class="px-6 py-4 text-sm text-slate-500">${accountRunCell(a)}</td><td class="px-6 py-4"><button onclick="toggleAccount(${a.id},${!a.is_active})" class="text-slate-600 hover:text-slate-800 mr-3">${a.is_active?'禁用':'启用'}</button><button onclick="deleteAccount(${a.id},'${a.name}')" class="text-red-500 hover:text-red-700">删除</button></td></tr>`).join('');}
         }
 
+        function accountRunCell(a){return `${a.last_run_at||'从未执行'}${a.last_run_status?` <span class="status-${a.last_run_status}">${a.last_run_status}</span>`:''}`;}
+
         function showAddAccountModal(){document.getElementById('add-account-modal').classList.remove('hidden');document.getElementById('add-account-modal').classList.add('flex');}
         function hideAddAccountModal(){document.getElementById('add-account-modal').classList.add('hidden');document.getElementById('add-account-modal').classList.remove('flex');document.getElementById('account-name').value='';document.getElementById('account-token').value='';}
 
@@ -894,12 +1211,15 @@ DASHBOARD_TEMPLATE = '''
         async function toggleAccount(id,active){const d=await api(`/api/accounts/${id}`,{method:'PUT',body:JSON.stringify({is_active:active})});if(d&&d.success){showToast('操作成功','success');loadAccounts();}}
         async function deleteAccount(id,name){if(!confirm(`确定删除 "${name}"？`))return;const d=await api(`/api/accounts/${id}`,{method:'DELETE'});if(d&&d.success){showToast('删除成功','success');loadAccounts();}}
 
+        function historyRow(h){return `<tr class="border-b border-slate-100"><td class="px-6 py-4 text-sm text-slate-500">${h.grab_time}</td><td class="px-6 py-4 font-medium text-slate-800">${h.account_name}</td><td class="px-6 py-4"><span class="px-2 py-1 rounded text-xs ${h.status==='success'?'bg-green-100 text-green-700':'bg-red-100 text-red-700'}">${h.status==='success'?'成功':'失败'}</span></td><td class="px-6 py-4 text-sm"><span class="text-green-600">${h.success_count}</span> / <span class="text-red-500">${h.failed_count}</span></td><td class="px-6 py-4"><button onclick="showDetail(${h.id})" class="text-slate-600 hover:text-slate-800 text-sm">查看详情</button></td></tr>`;}
+
         async function loadHistory(page=1) {
             const d=await api(`/api/history?page=${page}&per_page=20`);
             if(!d||!d.success)return;
+            historyPage=page;
             const t=document.getElementById('history-table');
             if(d.data.length===0){t.innerHTML='<tr><td colspan="5" class="px-6 py-8 text-center text-slate-400">暂无记录</td></tr>';}
-            else{t.innerHTML=d.data.map(h=>`<tr class="border-b border-slate-100"><td class="px-6 py-4 text-sm text-slate-500">${h.grab_time}</td><td class="px-6 py-4 font-medium text-slate-800">${h.account_name}</td><td class="px-6 py-4"><span class="px-2 py-1 rounded text-xs ${h.status==='success'?'bg-green-100 text-green-700':'bg-red-100 text-red-700'}">${h.status==='success'?'成功':'失败'}</span></td><td class="px-6 py-4 text-sm"><span class="text-green-600">${h.success_count}</span> / <span class="text-red-500">${h.failed_count}</span></td><td class="px-6 py-4"><button onclick="showDetail(${h.id})" class="text-slate-600 hover:text-slate-800 text-sm">查看详情</button></td></tr>`).join('');}
+            else{t.innerHTML=d.data.map(historyRow).join('');}
             const p=d.pagination,pe=document.getElementById('history-pagination');
             if(p.pages>1){pe.innerHTML=`<span class="text-sm text-slate-500">共 ${p.total} 条</span><div class="flex space-x-2">${p.page>1?`<button onclick="loadHistory(${p.page-1})" class="px-3 py-1 border border-slate-200 rounded hover:bg-slate-50">上一页</button>`:''}<span class="px-3 py-1 text-slate-600">${p.page}/${p.pages}</span>${p.page<p.pages?`<button onclick="loadHistory(${p.page+1})" class="px-3 py-1 border border-slate-200 rounded hover:bg-slate-50">下一页</button>`:''}</div>`;}else{pe.innerHTML='';}
         }
@@ -912,7 +1232,8 @@ DASHBOARD_TEMPLATE = '''
                     const h=d.data.find(x=>x.id===id);
                     if(h){
                         let details='';try{const cs=JSON.parse(h.details||'[]');details=cs.map(c=>`<div class="flex items-center justify-between p-3 bg-slate-50 rounded mb-2"><span class="text-slate-700">${c.name}</span><span class="${c.status==='success'?'text-green-600':'text-red-500'}">${c.status==='success'?'成功':'失败'}</span></div>`).join('');}catch(e){}
-                        document.getElementById('detail-content').innerHTML=`<div class="space-y-4"><div class="grid grid-cols-2 gap-3"><div class="bg-slate-50 p-3 rounded"><p class="text-xs text-slate-500">账号</p><p class="font-medium text-slate-800">${h.account_name}</p></div><div class="bg-slate-50 p-3 rounded"><p class="text-xs text-slate-500">时间</p><p class="font-medium text-slate-800">${h.grab_time}</p></div><div class="bg-slate-50 p-3 rounded"><p class="text-xs text-slate-500">成功</p><p class="font-medium text-green-600">${h.success_count}</p></div><div class="bg-slate-50 p-3 rounded"><p class="text-xs text-slate-500">失败</p><p class="font-medium text-red-500">${h.failed_count}</p></div></div>${details?`<div><p class="font-medium text-slate-700 mb-2">详情</p>${details}</div>`:''}${h.raw_output?`<div><p class="font-medium text-slate-700 mb-2">输出</p><pre class="bg-slate-800 text-slate-300 p-3 rounded text-sm overflow-x-auto max-h-60">${h.raw_output}</pre></div>`:''}</div>`;
+                        document.getElementById('detail-content').innerHTML=`<div class="space-y-4"><div class="grid grid-cols-2 gap-3"><div class="bg-slate-50 p-3 rounded"><p class="text-xs text-slate-500">账号</p><p class="font-medium text-slate-800">${h.account_name}</p></div><div class="bg-slate-50 p-3 rounded"><p class="text-xs text-slate-500">时间</p><p class="font-medium text-slate-800">${h.grab_time}</p></div><div class="bg-slate-50 p-3 rounded"><p class="text-xs text-slate-500">成功</p><p class="font-medium text-green-600">${h.success_count}</p></div><div class="bg-slate-50 p-3 rounded"><p class="text-xs text-slate-500">失败</p><p class="font-medium text-red-500">${h.failed_count}</p></div></div>${details?`<div><p class="font-medium text-slate-700 mb-2">详情</p>${details}</div>`:''}<div id="detail-raw"><p class="text-slate-400 text-sm">输出加载中...</p></div></div>`;
+                        api(`/api/history/${id}/raw`).then(r=>{const e=document.getElementById('detail-raw');if(!e)return;e.innerHTML=r&&r.success&&r.data?`<p class="font-medium text-slate-700 mb-2">输出</p><pre class="bg-slate-800 text-slate-300 p-3 rounded text-sm overflow-x-auto max-h-60">${r.data}</pre>`:'';});
                     }
                 }
             });
@@ -925,26 +1246,66 @@ DASHBOARD_TEMPLATE = '''
             if(!d||!d.success)return;
             const t=document.getElementById('logs-table');
             if(d.data.length===0){t.innerHTML='<tr><td colspan="4" class="px-6 py-8 text-center text-slate-400">暂无日志</td></tr>';}
-            else{t.innerHTML=d.data.map(l=>`<tr class="border-b border-slate-100"><td class="px-6 py-3 text-slate-500 text-sm">${l.created_at}</td><td class="px-6 py-3"><span class="log-${l.level.toLowerCase()}">${l.level}</span></td><td class="px-6 py-3 text-slate-500">${l.category}</td><td class="px-6 py-3 text-slate-700">${l.message}</td></tr>`).join('');}
+            else{t.innerHTML=d.data.map(logRow).join('');}
+        }
+
+        function logRow(l){return `<tr class="border-b border-slate-100"><td class="px-6 py-3 text-slate-500 text-sm">${l.created_at}</td><td class="px-6 py-3"><span class="log-${l.level.toLowerCase()}">${l.level}</span></td><td class="px-6 py-3 text-slate-500">${l.category}</td><td class="px-6 py-3 text-slate-700">${l.message}</td></tr>`;}
+
+        let logStream=null;
+
+        function highlightLog(c) {
+            return c.replace(/(成功|领取)/g,'<span class="log-success">$1</span>').replace(/(失败|错误|异常|Error)/g,'<span class="log-error">$1</span>').replace(/(警告|Warning)/g,'<span class="log-warning">$1</span>');
         }
 
         async function loadLogFile() {
             const d=await api('/api/logs/file?lines=200');
             if(d&&d.success){
                 const c=d.data||'暂无日志';
-                document.getElementById('log-file-content').innerHTML=c.replace(/(成功|领取)/g,'<span class="log-success">$1</span>').replace(/(失败|错误|异常|Error)/g,'<span class="log-error">$1</span>').replace(/(警告|Warning)/g,'<span class="log-warning">$1</span>');
+                document.getElementById('log-file-content').innerHTML=highlightLog(c);
+                followLogFile(d.offset);
             }
         }
 
+        function followLogFile(offset) {
+            stopLogStream();
+            if(!window.EventSource)return;
+            logStream=new EventSource('/api/logs/file/stream?offset='+(offset||0));
+            logStream.onmessage=e=>{
+                const pre=document.getElementById('log-file-content'),box=pre.parentElement;
+                const atBottom=box.scrollTop+box.clientHeight>=box.scrollHeight-20;
+                pre.insertAdjacentHTML('beforeend',highlightLog(e.data+'\\n'));
+                if(atBottom)box.scrollTop=box.scrollHeight;
+            };
+            logStream.onerror=()=>{
+                // 连接数已满时不再推送，定时重新读取
+                if(logStream&&logStream.readyState===EventSource.CLOSED){
+                    logStream=null;
+                    setTimeout(()=>{if(!logStream&&document.getElementById('tab-logs').classList.contains('active'))loadLogFile();},refreshInterval*1000);
+                }
+            };
+        }
+
+        function stopLogStream() {
+            if(logStream){logStream.close();logStream=null;}
+        }
+
         async function loadConfig() {
             const d=await api('/api/config');
             if(d&&d.success&&d.data.cron_hours){document.getElementById('config-cron-hours').value=d.data.cron_hours.value;}
+            loadScheduler();
+        }
+
+        async function loadScheduler() {
+            const d=await api('/api/scheduler'),s=d?.data;
+            if(!s||!s.enabled)return;
+            const last=s.last_run?` · 上次: ${s.last_run.started_at} (${(s.last_run.duration_ms/1000).toFixed(1)}s, ${s.last_run.status==='failed'?'失败':s.last_run.success+'/'+s.last_run.accounts+' 成功, 限流等待 '+((s.last_run.limiter_wait_ms||0)/1000).toFixed(1)+'s'})`:'';
+            document.getElementById('scheduler-next').textContent=`下次执行: ${s.next_run||'-'}${last}`;
         }
 
         async function saveConfig() {
             const h=document.getElementById('config-cron-hours').value;
             const d=await api('/api/config',{method:'PUT',body:JSON.stringify({cron_hours:h})});
-            if(d&&d.success){showToast('已保存','success');}else{showToast(d?.message||'保存失败','error');}
+            if(d&&d.success){showToast('已保存','success');setTimeout(loadScheduler,500);}else{showToast(d?.message||'保存失败','error');}
         }
 
         async function changePassword() {
@@ -957,7 +1318,17 @@ DASHBOARD_TEMPLATE = '''
         async function runGrab() {
             showToast('开始执行...','info');
             const d=await api('/api/grab/run',{method:'POST'});
-            if(d&&d.success){const r=d.results||[];const s=r.filter(x=>x.status==='success').length;showToast(`完成，成功 ${s}/${r.length}`,'success');loadDashboard();}else{showToast(d?.message||'执行失败','error');}
+            if(!d||!d.success){showToast(d?.message||'执行失败','error');return;}
+            pollGrabJob(d.job_id);
+        }
+
+        async function pollGrabJob(id) {
+            const d=await api(`/api/grab/jobs/${id}`);
+            if(!d||!d.success){showToast(d?.message||'查询任务失败','error');return;}
+            const j=d.data;
+            if(j.status==='pending'||j.status==='running'){showToast(`执行中 ${j.completed}/${j.total} (${j.progress}%)`,'info');setTimeout(()=>pollGrabJob(id),2000);return;}
+            const r=j.results||[];const s=r.filter(x=>x.status==='success').length;
+            showToast(j.status==='completed'?`完成，成功 ${s}/${r.length}`:'任务执行失败',j.status==='completed'?'success':'error');loadDashboard();
         }
 
         async function loadUsers() {
@@ -971,13 +1342,104 @@ DASHBOARD_TEMPLATE = '''
 
         async function logout(){await api('/api/auth/logout',{method:'POST'});window.location.href='/login';}
 
-        document.addEventListener('DOMContentLoaded',()=>{loadCurrentUser();loadDashboard();});
+        let eventSource=null,pollTimer=null,refreshInterval=30,dashboardToday=null,historyPage=1;
+
+        // 实时事件：收到新数据时增量更新页面，连接断开期间按 auto_refresh_interval 轮询
+        function connectEvents() {
+            if(!window.EventSource){startPolling();return;}
+            const source=eventSource=new EventSource('/api/events');
+            source.onopen=()=>stopPolling();
+            source.onerror=()=>{
+                startPolling();
+                if(source.readyState===EventSource.CLOSED&&eventSource===source)eventSource=null;
+            };
+            source.addEventListener('history',e=>onHistoryEvent(JSON.parse(e.data)));
+            source.addEventListener('account',e=>onAccountEvent(JSON.parse(e.data)));
+            source.addEventListener('log',e=>onLogEvent(JSON.parse(e.data)));
+            // 断开太久无法补发时重新加载当前页面
+            source.addEventListener('reset',()=>refreshActiveTab());
+        }
+
+        function startPolling(){if(!pollTimer)pollTimer=setInterval(pollTick,refreshInterval*1000);}
+        function pollTick() {
+            // 断线期间已经重新加载，放弃补发，改用新的连接
+            if(eventSource&&eventSource.readyState!==EventSource.OPEN){eventSource.close();eventSource=null;}
+            refreshActiveTab();
+            if(!eventSource&&window.EventSource)connectEvents();
+        }
+        function stopPolling(){if(pollTimer){clearInterval(pollTimer);pollTimer=null;}}
+
+        function refreshActiveTab() {
+            const name=document.querySelector('.tab-content.active').id.slice(4);
+            if(name==='dashboard')loadDashboard();
+            else if(name==='accounts')loadAccounts();
+            else if(name==='history')loadHistory(historyPage);
+            else if(name==='logs')loadLogs();
+        }
+
+        function prependItem(id,html,limit) {
+            const c=document.getElementById(id);
+            c.querySelectorAll('.text-center').forEach(e=>e.closest('tr')?e.closest('tr').remove():e.remove());
+            c.insertAdjacentHTML('afterbegin',html);
+            while(c.children.length>limit)c.lastElementChild.remove();
+        }
+
+        function onHistoryEvent(h) {
+            const total=document.getElementById('stat-total');
+            total.textContent=(parseInt(total.textContent)||0)+1;
+            if(h.grab_time&&h.grab_time.slice(0,10)===dashboardToday){
+                const today=document.getElementById('stat-today');
+                today.textContent=(parseInt(today.textContent)||0)+h.success_count;
+            }
+            prependItem('recent-grabs',recentGrabItem(h),5);
+            if(historyPage===1)prependItem('history-table',historyRow(h),20);
+        }
+
+        function onAccountEvent(a) {
+            const cell=document.getElementById('account-run-'+a.id);
+            if(cell)cell.innerHTML=accountRunCell(a);
+        }
+
+        function onLogEvent(l) {
+            const level=document.getElementById('log-filter').value;
+            if(!level||l.level===level)prependItem('logs-table',logRow(l),50);
+        }
+
+        document.addEventListener('DOMContentLoaded',()=>{
+            loadCurrentUser();loadDashboard();
+            api('/api/config').then(d=>{const v=parseInt(d?.data?.auto_refresh_interval?.value);if(v>0)refreshInterval=Math.max(v,5);connectEvents();});
+        });
     </script>
 </body>
 </html>
 '''
 
+INLINE_SCRIPT_PATTERN = re.compile(r'<script>\n(.*?)</script>', re.S)
+# 页面拆出的脚本，文件名带内容哈希
+ASSETS = {}
+
+
+def build_page(name, template):
+    """启动时编译并渲染一次模板，内联脚本拆成可长期缓存的静态资源"""
+    html = app.jinja_env.from_string(template).render()
+    match = INLINE_SCRIPT_PATTERN.search(html)
+    if match:
+        script = StaticAsset(match.group(1), mimetype='application/javascript', immutable=True)
+        filename = f'{name}-{script.etag[:12]}.js'
+        ASSETS[filename] = script
+        html = f'{html[:match.start()]}<script src="/assets/{filename}"></script>{html[match.end():]}'
+    return StaticAsset(html)
+
+
+LOGIN_PAGE = build_page('login', LOGIN_TEMPLATE)
+DASHBOARD_PAGE = build_page('dashboard', DASHBOARD_TEMPLATE)
+
 init_db(app)
+recover_interrupted_jobs(app)
+log_sink.start(DB_PATH)
+start_archiver(DB_PATH)
+if SCHEDULER_ENABLED:
+    scheduler.start()
 
 if __name__ == '__main__':
     port = int(os.environ.get('WEB_PORT', 5000))